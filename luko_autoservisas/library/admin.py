@@ -29,7 +29,7 @@ class CarAdmin(admin.ModelAdmin):
 
 
 class PartServiceAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price')
+    list_display = ('name', 'price', 'review_count', 'last_reviewed_at')
     search_fields = ('name',)
 
 
@@ -41,9 +41,41 @@ class OrderLineAdmin(admin.ModelAdmin):
     
 
 
+class OrderValueFilter(admin.SimpleListFilter):
+    title = 'order value'
+    parameter_name = 'value'
+    # total_amount from lowest up to, but not including, highest
+    RANGES = {
+        'small': (None, 50),
+        'medium': (50, 200),
+        'large': (200, 1000),
+        'huge': (1000, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return (
+            ('small', 'under 50'),
+            ('medium', '50 - 200'),
+            ('large', '200 - 1000'),
+            ('huge', 'over 1000'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.RANGES:
+            return queryset
+        lowest, highest = self.RANGES[self.value()]
+        if lowest is not None:
+            queryset = queryset.filter(total_amount__gte=lowest)
+        if highest is not None:
+            queryset = queryset.filter(total_amount__lt=highest)
+        return queryset
+
+
 class ServiceOrderAdmin(admin.ModelAdmin):
-    list_display = ('car', 'date', 'order_status')
+    list_display = ('car', 'date', 'order_status', 'total_amount', 'line_count')
     search_fields = ('car__customer', 'date', 'order_status')
+    list_filter = ('order_status', OrderValueFilter)
+    readonly_fields = ('total_amount', 'line_count')
     inlines = [OrderLineInline]
 
 @admin.register(models.PartServiceReview)
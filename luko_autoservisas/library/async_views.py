@@ -0,0 +1,105 @@
+"""Async versions of the read heavy pages, for serving through asgi.py.
+
+The data is fetched with the async ORM and independent lookups are awaited
+together. Django 4.2 still runs each query in its single sync thread, so the
+gain is in not holding a worker thread per slow client; templates are
+rendered in that thread too, as the session, messages and lazy user may
+need the database while rendering.
+"""
+import asyncio
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.http import Http404, HttpRequest, HttpResponse
+from django.shortcuts import render
+from django.utils.functional import SimpleLazyObject
+from . import brands, catalog_cache, forms, models, pagination, reviews, stats, views, visits
+
+PART_PAGE_SIZE = 8
+
+
+async def arender(request: HttpRequest, template_name: str, context: dict) -> HttpResponse:
+    return await sync_to_async(render)(request, template_name, context)
+
+
+async def index(request: HttpRequest):
+    num_visits, dashboard = await asyncio.gather(
+        sync_to_async(visits.record)(request), stats.aget_dashboard(),
+    )
+    context = {
+        'num_carModel': dashboard['counters'][stats.CAR_MODELS],
+        'brands': dashboard['brands'],
+        'parts': dashboard['counters'][stats.PARTS],
+        'orders': dashboard['counters'][stats.ORDERS],
+        'completed_orders': dashboard['counters'][stats.COMPLETED_ORDERS],
+        'num_visits': num_visits
+    }
+    return visits.remember_visitor(request, await arender(request, 'library/index.html', context))
+
+
+async def parts(request: HttpRequest):
+    part_pages = pagination.CursorPaginator(models.PartService.objects.all(), PART_PAGE_SIZE, ordering=('name', 'pk'))
+    cursor = request.GET.get('cursor')
+    version = await catalog_cache.acatalog_version()
+    fragment_key = make_template_fragment_key(
+        'part_list_page', [version, request.GET.get('cursor', ''), request.GET.get('query', '')],
+    )
+    if await cache.ahas_key(fragment_key):
+        # the page is cached, it is only read if the fragment expires in between
+        part_list = SimpleLazyObject(lambda: part_pages.get_page(cursor))
+    else:
+        part_list = await part_pages.aget_page(cursor)
+    return await arender(request, 'library/part_list.html', {
+        'part_list': part_list,
+        'catalog_version': version,
+        'cache_timeout': catalog_cache.FRAGMENT_TIMEOUT,
+    })
+
+
+async def brand_list(request: HttpRequest):
+    hierarchy = await brands.aget_hierarchy()
+    return await arender(request, 'library/brand_list.html', {'brand_list': hierarchy.values()})
+
+
+async def load_user(request: HttpRequest):
+    # the user is loaded lazily from the session, which needs the sync thread
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
+
+
+async def part_detail(request: HttpRequest, pk: int):
+    review_pages = pagination.CursorPaginator(
+        reviews.review_feed(pk), reviews.FEED_PAGE_SIZE, ordering=reviews.FEED_ORDERING, count_total=False,
+    )
+    # the review page only needs the pk from the url, so it does not wait for the part
+    part, page, user = await asyncio.gather(
+        models.PartService.objects.filter(pk=pk).afirst(),
+        review_pages.aget_page(request.GET.get('cursor')),
+        load_user(request),
+    )
+    if part is None:
+        raise Http404("No part or service found.")
+    form = forms.PartServiceReviewForm(initial={'partservice': part, 'reviewer': user})
+    return await arender(request, 'library/part_detail.html', {
+        'partservice': part, 'object': part, 'page_obj': page, 'form': form,
+    })
+
+
+async def order_list(request: HttpRequest):
+    # the sync view builds the query, sort order and filters, only the fetching differs
+    view = views.ServiceListView()
+    view.setup(request)
+    paginator = pagination.CursorPaginator(
+        view.get_queryset(), view.paginate_by, ordering=view.get_cursor_ordering(), count_total=False,
+    )
+    page = await paginator.aget_page(request.GET.get('cursor'))
+    return await arender(request, 'library/serviceorder_list.html', {
+        'service_orders': page.object_list,
+        'object_list': page.object_list,
+        'page_obj': page,
+        'paginator': paginator,
+        'is_paginated': page.has_other_pages(),
+        'search': True,
+        'filter_form': view.get_filter_form(),
+        'pager_params': view.get_pager_params(),
+    })
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import statistics
+import time
+from contextlib import contextmanager
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from user_profile import urls as user_profile_urls
+from . import models, urls as library_urls
+
+URLCONFS = (library_urls, user_profile_urls)
+# routes changing data on GET would alter the data being measured
+SKIP_ROUTES = {'cancel_order'}
+# async view and the sync view it mirrors
+ASYNC_ROUTES = {
+    'async_index': 'index',
+    'async_part_list': 'part_list',
+    'async_brand_list': 'brand_list',
+    'async_part_detail': 'part_detail',
+    'async_serviceorder_list': 'serviceorder_list',
+}
+
+
+def first_pk(queryset):
+    return queryset.order_by('pk').values_list('pk', flat=True).first()
+
+
+def sample_kwargs(user):
+    """URL kwargs per route name, picked from the seeded data."""
+    car_id = first_pk(models.Car.objects.filter(customer=user, orders__isnull=False))
+    return {
+        'brand_detail': {'brand': models.CarModel.objects.order_by('pk').values_list('brand', flat=True).first()},
+        'customer_detail': {'pk': user.pk},
+        'car_service_orders': {'car_id': car_id},
+        'place_order': {'car_id': car_id},
+        'part_detail': {'pk': first_pk(models.PartService.objects.all())},
+        'async_part_detail': {'pk': first_pk(models.PartService.objects.all())},
+    }
+
+
+def routes(user):
+    """(name, url) of every named GET route in the library and user_profile apps."""
+    kwargs = sample_kwargs(user)
+    for urlconf in URLCONFS:
+        for pattern in urlconf.urlpatterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name or pattern.name in SKIP_ROUTES:
+                continue
+            if pattern.pattern.converters:
+                route_kwargs = kwargs.get(pattern.name)
+                if not route_kwargs or None in route_kwargs.values():
+                    continue
+                yield pattern.name, reverse(pattern.name, kwargs=route_kwargs)
+            else:
+                yield pattern.name, reverse(pattern.name)
+
+
+def percentile(sorted_values, fraction):
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def measure(client, url, iterations):
+    timings, query_counts, statuses = [], [], set()
+    for iteration in range(iterations):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            try:
+                response = client.get(url)
+                if response.streaming:
+                    for chunk in response.streaming_content:
+                        pass
+                statuses.add(response.status_code)
+            except Exception as error:
+                statuses.add(type(error).__name__)
+            timings.append((time.perf_counter() - started) * 1000)
+        query_counts.append(len(queries))
+    return dict(summarize(url, timings, statuses), queries=max(query_counts))
+
+
+def summarize(url, timings, statuses):
+    timings = sorted(timings)
+    return {
+        'url': url,
+        'status': sorted(map(str, statuses)),
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p90_ms': round(percentile(timings, 0.9), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+        'mean_ms': round(statistics.fmean(timings), 2),
+    }
+
+
+async def ameasure(client, url, iterations, concurrency):
+    """Like measure(), with up to concurrency requests in flight on one event loop."""
+    timings, statuses = [], set()
+
+    async def fetch():
+        started = time.perf_counter()
+        try:
+            response = await client.get(url)
+            statuses.add(response.status_code)
+        except Exception as error:
+            statuses.add(type(error).__name__)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    for start in range(0, iterations, concurrency):
+        await asyncio.gather(*(fetch() for request in range(min(concurrency, iterations - start))))
+    elapsed = time.perf_counter() - started
+    return dict(summarize(url, timings, statuses), per_second=round(iterations / elapsed, 1))
+
+
+def benchmark_host():
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+    return hosts[0] if hosts else 'localhost'
+
+
+@contextmanager
+def quiet_request_log():
+    # failing routes are recorded in the results, not logged on every iteration
+    request_logger = logging.getLogger('django.request')
+    level = request_logger.level
+    request_logger.setLevel(logging.CRITICAL)
+    try:
+        yield
+    finally:
+        request_logger.setLevel(level)
+
+
+def run(user, iterations=20):
+    client = Client(HTTP_HOST=benchmark_host())
+    client.force_login(user)
+    with quiet_request_log():
+        return {name: measure(client, url, iterations) for name, url in routes(user)}
+
+
+def run_asgi(user, iterations=20, concurrency=10):
+    """Each async view through the ASGI handler against its sync twin through WSGI.
+
+    WSGI requests run one after another as on a single worker thread, the
+    ASGI ones concurrency at a time on one event loop.
+    """
+    kwargs = sample_kwargs(user)
+    client = Client(HTTP_HOST=benchmark_host())
+    client.force_login(user)
+    async_client = AsyncClient()
+    async_client.force_login(user)
+    results = {}
+    # the async test client always sends the testserver host
+    allowed_hosts = [*settings.ALLOWED_HOSTS, benchmark_host(), 'testserver']
+    with quiet_request_log(), override_settings(ALLOWED_HOSTS=allowed_hosts):
+        for async_name, name in ASYNC_ROUTES.items():
+            route_kwargs = kwargs.get(name)
+            if route_kwargs is not None and None in route_kwargs.values():
+                continue
+            wsgi = measure(client, reverse(name, kwargs=route_kwargs), iterations)
+            wsgi['per_second'] = round(1000 / wsgi['mean_ms'], 1) if wsgi['mean_ms'] else None
+            asgi = async_to_sync(ameasure)(
+                async_client, reverse(async_name, kwargs=route_kwargs), iterations, concurrency,
+            )
+            results[name] = {'wsgi': wsgi, 'asgi': asgi}
+    return results
+
+
+def compare(baseline, results, tolerance=0.25):
+    """Regressions of results against a saved baseline, as readable lines."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if result['queries'] > before['queries']:
+            regressions.append(f"{name}: {before['queries']} -> {result['queries']} queries")
+        if result['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {before['p50_ms']} -> {result['p50_ms']} ms")
+    return regressions
+
+
+def load(path):
+    with open(path, encoding='utf-8') as baseline_file:
+        return json.load(baseline_file)
+
+
+def save(path, results):
+    with open(path, 'w', encoding='utf-8') as baseline_file:
+        json.dump(results, baseline_file, indent=2, sort_keys=True)
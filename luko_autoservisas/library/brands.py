@@ -0,0 +1,61 @@
+"""Brand -> model -> year hierarchy of the catalog with car and order counts.
+
+Built from one GROUP BY over the car models and kept in the default cache,
+shared by the worker processes, until a car model, car or order is added,
+changed or removed. Duplicate model/year rows fold into one entry.
+"""
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count
+from . import models
+
+CACHE_KEY = 'library:brand_hierarchy'
+
+
+def build() -> dict:
+    """{brand: entry} in brand order, each entry holding its models and their years."""
+    # always the primary, the result is cached until the next change
+    rows = models.CarModel.objects.using(DEFAULT_DB_ALIAS).order_by('brand', 'model', 'year').values(
+        'brand', 'model', 'year',
+    ).annotate(
+        car_count=Count('cars', distinct=True),
+        order_count=Count('cars__orders'),
+    )
+    hierarchy = {}
+    for row in rows:
+        brand = hierarchy.setdefault(row['brand'], {
+            'brand': row['brand'], 'car_count': 0, 'order_count': 0, 'year_count': 0, 'models': {},
+        })
+        model = brand['models'].setdefault(row['model'], {
+            'model': row['model'], 'car_count': 0, 'order_count': 0, 'years': [],
+        })
+        model['years'].append({'year': row['year'], 'car_count': row['car_count'], 'order_count': row['order_count']})
+        for level in (brand, model):
+            level['car_count'] += row['car_count']
+            level['order_count'] += row['order_count']
+        brand['year_count'] += 1
+    for brand in hierarchy.values():
+        brand['models'] = list(brand['models'].values())
+    return hierarchy
+
+
+def get_hierarchy() -> dict:
+    hierarchy = cache.get(CACHE_KEY)
+    if hierarchy is None:
+        hierarchy = build()
+        cache.set(CACHE_KEY, hierarchy, None)
+    return hierarchy
+
+
+async def aget_hierarchy() -> dict:
+    hierarchy = await cache.aget(CACHE_KEY)
+    if hierarchy is None:
+        hierarchy = await sync_to_async(get_hierarchy)()
+    return hierarchy
+
+
+def invalidate() -> None:
+    cache.delete(CACHE_KEY)
+    # a request running before commit could cache the old counts again
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
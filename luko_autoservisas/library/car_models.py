@@ -0,0 +1,143 @@
+"""In-process index of the car model catalog for matching free text and typeahead.
+
+Brand and model names are compared normalized: case, spaces and punctuation
+are ignored and brand aliases such as "VW" resolve to the catalog brand. The
+index is built from one query and kept per process until the CarModel
+signals bump a version key in the default cache. Processes sharing that cache
+(settings.CACHES) rebuild on their next lookup, lookups in between do not
+touch the database. A process can still be one change behind, so a resolved
+pk is only a hint that writers check before using it.
+"""
+import bisect
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from . import models
+
+VERSION_KEY = 'library:car_model_version'
+COMPLETE_LIMIT = 10
+
+# normalized alias -> brand as it should be stored, CAR_BRAND_ALIASES adds to these
+BRAND_ALIASES = {
+    'vw': 'Volkswagen',
+    'volkswagon': 'Volkswagen',
+    'merc': 'Mercedes-Benz',
+    'mercedes': 'Mercedes-Benz',
+    'mb': 'Mercedes-Benz',
+    'chevy': 'Chevrolet',
+    'alfa': 'Alfa Romeo',
+    'landrover': 'Land Rover',
+    'rangerover': 'Land Rover',
+}
+
+_NOT_NAME = re.compile(r'[\W_]+')
+
+
+def normalize(text: str) -> str:
+    return _NOT_NAME.sub('', text.casefold())
+
+
+def aliases() -> dict:
+    configured = getattr(settings, 'CAR_BRAND_ALIASES', {})
+    return {normalize(alias): brand for alias, brand in {**BRAND_ALIASES, **configured}.items()}
+
+
+class CarModelIndex:
+    def __init__(self, rows, brand_aliases):
+        self.aliases = brand_aliases
+        spellings = defaultdict(Counter)
+        model_spellings = defaultdict(Counter)
+        self.ids = {}
+        self.years = defaultdict(set)
+        # lowest pk first, so the oldest of duplicate rows is the one reused
+        for pk, brand, model, year in sorted(rows):
+            brand_key, model_key = self.brand_key(brand), normalize(model)
+            spellings[brand_key][brand] += 1
+            model_spellings[brand_key, model_key][model] += 1
+            self.ids.setdefault((brand_key, model_key, year), pk)
+            self.years[brand_key, model_key].add(year)
+        # the alias target, or else the spelling most rows use
+        self.brands = {
+            key: self.aliases.get(key) or counts.most_common(1)[0][0] for key, counts in spellings.items()
+        }
+        self.models = {key: counts.most_common(1)[0][0] for key, counts in model_spellings.items()}
+        # sorted (normalized, brand key) pairs for prefix search, aliases included
+        self.brand_prefixes = sorted(
+            [(key, key) for key in self.brands]
+            + [(alias, normalize(brand)) for alias, brand in self.aliases.items() if normalize(brand) in self.brands]
+        )
+        self.model_prefixes = defaultdict(list)
+        for brand_key, model_key in sorted(self.models):
+            self.model_prefixes[brand_key].append(model_key)
+
+    def brand_key(self, brand: str) -> str:
+        key = normalize(brand)
+        alias = self.aliases.get(key)
+        return normalize(alias) if alias else key
+
+    def resolve(self, brand: str, model: str, year: int):
+        """The catalog spelling of a brand and model and the matching CarModel pk, or None."""
+        brand_key, model_key = self.brand_key(brand), normalize(model)
+        canonical_brand = self.brands.get(brand_key) or self.aliases.get(normalize(brand)) or brand.strip()
+        canonical_model = self.models.get((brand_key, model_key)) or model.strip()
+        return canonical_brand, canonical_model, self.ids.get((brand_key, model_key, year))
+
+    def complete_brands(self, prefix: str, limit=COMPLETE_LIMIT) -> list:
+        prefix = normalize(prefix)
+        start = bisect.bisect_left(self.brand_prefixes, (prefix,))
+        found = []
+        for name, brand_key in self.brand_prefixes[start:]:
+            if not name.startswith(prefix) or len(found) >= limit:
+                break
+            if self.brands[brand_key] not in found:
+                found.append(self.brands[brand_key])
+        return found
+
+    def complete_models(self, brand: str, prefix: str, limit=COMPLETE_LIMIT) -> list:
+        brand_key, prefix = self.brand_key(brand), normalize(prefix)
+        model_keys = self.model_prefixes.get(brand_key, [])
+        start = bisect.bisect_left(model_keys, prefix)
+        found = []
+        for model_key in model_keys[start:start + limit]:
+            if not model_key.startswith(prefix):
+                break
+            found.append({
+                'brand': self.brands[brand_key],
+                'model': self.models[brand_key, model_key],
+                'years': sorted(self.years[brand_key, model_key]),
+            })
+        return found
+
+
+_lock = threading.Lock()
+_loaded = (None, None)
+
+
+def current_version():
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def get_index() -> CarModelIndex:
+    global _loaded
+    version = current_version()
+    index, loaded_version = _loaded
+    if index is None or loaded_version != version:
+        with _lock:
+            index, loaded_version = _loaded
+            if index is None or loaded_version != version:
+                index = CarModelIndex(
+                    models.CarModel.objects.order_by().values_list('pk', 'brand', 'model', 'year'), aliases(),
+                )
+                _loaded = (index, version)
+    return index
+
+
+def invalidate() -> None:
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def resolve(brand: str, model: str, year: int):
+    return get_index().resolve(brand, model, year)
@@ -0,0 +1,19 @@
+import time
+from django.core.cache import cache
+
+VERSION_KEY = 'library:catalog_version'
+# cached fragments are dropped through the version, the timeout only bounds stale entries
+FRAGMENT_TIMEOUT = 24 * 60 * 60
+
+
+def catalog_version() -> int:
+    # a fresh timestamp when the key was evicted, so old fragments never match again
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def invalidate() -> None:
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+async def acatalog_version() -> int:
+    return await cache.aget_or_set(VERSION_KEY, time.time_ns, None)
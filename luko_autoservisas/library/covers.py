@@ -0,0 +1,56 @@
+import os
+from django.conf import settings
+from PIL import Image
+from .files import content_hash, save_image
+
+DERIVATIVES_DIR = 'part_covers/derivatives'
+# name: largest side in pixels, retina is the detail size for 2x screens
+COVER_SIZES = {
+    'card': 300,
+    'detail': 600,
+    'retina': 1200,
+}
+COVER_FORMATS = {
+    'webp': 'WEBP',
+    'jpg': 'JPEG',
+}
+
+
+def derivative_name(cover_hash: str, size: str, extension: str) -> str:
+    return f"{DERIVATIVES_DIR}/{cover_hash[:32]}_{size}.{extension}"
+
+
+def derivative_url(cover_hash: str, size: str, extension: str) -> str:
+    return f"{settings.MEDIA_URL}{derivative_name(cover_hash, size, extension)}"
+
+
+def srcset(cover_hash: str, extension: str, sizes=tuple(COVER_SIZES)) -> str:
+    return ", ".join(
+        f"{derivative_url(cover_hash, size, extension)} {COVER_SIZES[size]}w" for size in sizes
+    )
+
+
+def render_derivatives(source_path: str, media_root=None) -> str:
+    """Writes every size and format of a cover, returns the cover content hash.
+
+    Names are derived from the content, so covers whose derivatives already
+    exist are not decoded at all.
+    """
+    media_root = str(media_root or settings.MEDIA_ROOT)
+    cover_hash = content_hash(source_path)
+    paths = {
+        (size, extension): os.path.join(media_root, derivative_name(cover_hash, size, extension))
+        for size in COVER_SIZES
+        for extension in COVER_FORMATS
+    }
+    if all(os.path.exists(path) for path in paths.values()):
+        return cover_hash
+    os.makedirs(os.path.join(media_root, DERIVATIVES_DIR), exist_ok=True)
+    with Image.open(source_path) as cover:
+        cover = cover.convert('RGB')
+        for size, max_side in COVER_SIZES.items():
+            resized = cover.copy()
+            resized.thumbnail((max_side, max_side))
+            for extension, image_format in COVER_FORMATS.items():
+                save_image(resized, paths[(size, extension)], image_format, quality=80, optimize=True)
+    return cover_hash
@@ -0,0 +1,76 @@
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from . import models
+
+CHUNK_SIZE = 2000
+# column name and the lookup it is read from, one row per order line
+EXPORT_COLUMNS = (
+    ('order_id', 'pk'),
+    ('order_date', 'date'),
+    ('order_status', 'order_status'),
+    ('order_total', 'total_amount'),
+    ('line_count', 'line_count'),
+    ('customer', 'car__customer__username'),
+    ('customer_email', 'car__customer__email'),
+    ('plate', 'car__plate'),
+    ('vin', 'car__vin'),
+    ('brand', 'car__car_model__brand'),
+    ('model', 'car__car_model__model'),
+    ('year', 'car__car_model__year'),
+    ('line_id', 'lines__pk'),
+    ('part_service', 'lines__part_service__name'),
+    ('quantity', 'lines__quantity'),
+    ('price', 'lines__price'),
+)
+HEADER = [name for name, lookup in EXPORT_COLUMNS]
+
+
+def export_rows(date_from=None, date_to=None, status=None, min_total=None, max_total=None, using=None):
+    """Yields one tuple per order line, orders without lines get one empty line.
+
+    A single joined query read with a server side iterator, so memory use does
+    not depend on the number of orders.
+    """
+    orders = models.ServiceOrder.objects.using(using)
+    if date_from:
+        orders = orders.filter(date__gte=date_from)
+    if date_to:
+        orders = orders.filter(date__lte=date_to)
+    if status is not None and status != '':
+        orders = orders.filter(order_status=status)
+    if min_total is not None:
+        orders = orders.filter(total_amount__gte=min_total)
+    if max_total is not None:
+        orders = orders.filter(total_amount__lte=max_total)
+    rows = orders.order_by('pk', 'lines__pk').values_list(*(lookup for name, lookup in EXPORT_COLUMNS))
+    return rows.iterator(chunk_size=CHUNK_SIZE)
+
+
+class Echo:
+    """File-like object handing each written csv line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def json_stream(rows):
+    yield '['
+    separator = '\n'
+    for row in rows:
+        yield separator + json.dumps(dict(zip(HEADER, row)), cls=DjangoJSONEncoder)
+        separator = ',\n'
+    yield '\n]\n'
+
+
+STREAMS = {
+    'csv': (csv_stream, 'text/csv'),
+    'json': (json_stream, 'application/json'),
+}
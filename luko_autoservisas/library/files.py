@@ -0,0 +1,18 @@
+"""File helpers shared by the part cover and profile photo processing."""
+import hashlib
+import os
+
+
+def content_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_image(image, path: str, image_format: str, **options) -> None:
+    """Saves a PIL image so that a reader never sees half a file."""
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    image.save(temporary_path, image_format, **options)
+    os.replace(temporary_path, path)
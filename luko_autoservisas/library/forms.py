@@ -10,12 +10,36 @@ class AddCarForm(forms.ModelForm):
         model = models.Car
         fields = ['brand', 'model', 'year', 'plate', 'vin', 'color']
 
-class OrderForm(forms.Form):
-    part_service = forms.ModelChoiceField(
-        queryset=models.PartService.objects.all(),
-        label="Select Part or Service",
+class OrderLineForm(forms.Form):
+    # an id picked through the part autocomplete, the catalog is too big for a select;
+    # the formset checks all submitted ids with one query
+    part_service = forms.IntegerField(
+        required=False, min_value=1, label="Part or Service",
+        widget=forms.TextInput(attrs={'list': 'part-suggestions', 'autocomplete': 'off', 'class': 'part-input'}),
     )
-    quantity = forms.IntegerField(min_value=1, label="Quantity")
+    quantity = forms.IntegerField(min_value=1, initial=1, required=False, label="Quantity")
+
+
+class BaseOrderLineFormSet(forms.BaseFormSet):
+    def clean(self):
+        if any(self.errors):
+            return
+        self.lines = []
+        for form in self.forms:
+            part_service_id = form.cleaned_data.get('part_service')
+            if part_service_id:
+                self.lines.append((part_service_id, form.cleaned_data.get('quantity') or 1))
+        if not self.lines:
+            raise forms.ValidationError("Add at least one part or service.")
+        # current prices of every line in a single query
+        self.part_services = models.PartService.objects.in_bulk({part_id for part_id, quantity in self.lines})
+        if len(self.part_services) != len({part_id for part_id, quantity in self.lines}):
+            raise forms.ValidationError("Some of the selected parts or services are no longer available.")
+
+
+OrderLineFormSet = forms.formset_factory(
+    OrderLineForm, formset=BaseOrderLineFormSet, extra=15, max_num=50, validate_max=True,
+)
 
 
 class PartServiceReviewForm(forms.ModelForm):
@@ -41,3 +65,36 @@ class PartServiceReviewForm(forms.ModelForm):
         labels = {
             'content': '',
         }
+
+
+class OrderExportForm(forms.Form):
+    format = forms.ChoiceField(choices=(('csv', 'CSV'), ('json', 'JSON')), required=False)
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+    status = forms.TypedChoiceField(
+        choices=(('', 'any'), *models.ORDER_STATUS), coerce=int, empty_value=None, required=False,
+    )
+    min_total = forms.DecimalField(max_digits=12, decimal_places=2, required=False)
+    max_total = forms.DecimalField(max_digits=12, decimal_places=2, required=False)
+
+
+class OrderListFilterForm(forms.Form):
+    sort = forms.ChoiceField(
+        choices=(('', 'customer car'), ('value', 'highest value'), ('-value', 'lowest value')), required=False,
+    )
+    min_total = forms.DecimalField(max_digits=12, decimal_places=2, required=False)
+    max_total = forms.DecimalField(max_digits=12, decimal_places=2, required=False)
+
+    def filter(self, queryset):
+        if self.cleaned_data.get('min_total') is not None:
+            queryset = queryset.filter(total_amount__gte=self.cleaned_data['min_total'])
+        if self.cleaned_data.get('max_total') is not None:
+            queryset = queryset.filter(total_amount__lte=self.cleaned_data['max_total'])
+        return queryset
+
+
+class ReportForm(forms.Form):
+    month = forms.DateField(input_formats=['%Y-%m'], required=False, widget=forms.DateInput(format='%Y-%m'))
+    status = forms.TypedChoiceField(
+        choices=(('', 'any'), *models.ORDER_STATUS), coerce=int, empty_value=None, required=False,
+    )
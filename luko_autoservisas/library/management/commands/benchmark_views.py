@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from ... import benchmark, models
+
+
+class Command(BaseCommand):
+    help = "Measures latency percentiles and query counts of every library and user_profile route."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--username', help="User to log in as, defaults to the first customer with orders.")
+        parser.add_argument('--save', help="Write the results as a JSON baseline.")
+        parser.add_argument('--compare', help="Fail on regressions against this JSON baseline.")
+        parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed p50 slowdown, 0.25 is 25%%.")
+        parser.add_argument('--asgi', action='store_true', help="Compare the async views under ASGI with WSGI.")
+        parser.add_argument('--concurrency', type=int, default=10, help="ASGI requests in flight with --asgi.")
+
+    def handle(self, *args, **options):
+        if options['username']:
+            user = models.User.objects.filter(username=options['username']).first()
+        else:
+            car = models.Car.objects.filter(orders__isnull=False).select_related('customer').order_by('pk').first()
+            user = car.customer if car else None
+        if user is None:
+            raise CommandError("No user to benchmark with, run seed_data first.")
+        if options['asgi']:
+            self.compare_asgi(user, options['iterations'], options['concurrency'])
+            return
+        results = benchmark.run(user, options['iterations'])
+        self.stdout.write(f"{'route':<22} {'status':<8} {'queries':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<22} {','.join(result['status']):<8} {result['queries']:>7} "
+                f"{result['p50_ms']:>8} {result['p90_ms']:>8} {result['p99_ms']:>8}"
+            )
+        if options['save']:
+            benchmark.save(options['save'], results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['save']}."))
+        if options['compare']:
+            regressions = benchmark.compare(benchmark.load(options['compare']), results, options['tolerance'])
+            if regressions:
+                raise CommandError("Regressions:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def compare_asgi(self, user, iterations, concurrency):
+        results = benchmark.run_asgi(user, iterations, concurrency)
+        self.stdout.write(
+            f"{'route':<22} {'wsgi p50':>9} {'wsgi p99':>9} {'wsgi r/s':>9} "
+            f"{'asgi p50':>9} {'asgi p99':>9} {'asgi r/s':>9}"
+        )
+        for name, result in results.items():
+            wsgi, asgi = result['wsgi'], result['asgi']
+            self.stdout.write(
+                f"{name:<22} {wsgi['p50_ms']:>9} {wsgi['p99_ms']:>9} {wsgi['per_second']:>9} "
+                f"{asgi['p50_ms']:>9} {asgi['p99_ms']:>9} {asgi['per_second']:>9}"
+            )
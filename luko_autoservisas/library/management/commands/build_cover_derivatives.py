@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from ... import catalog_cache, covers, models
+
+
+class Command(BaseCommand):
+    help = "Builds the resized WebP and JPEG derivatives of existing part covers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Also rebuild covers that already have derivatives.")
+
+    def handle(self, *args, **options):
+        parts = models.PartService.objects.exclude(cover='').exclude(cover__isnull=True)
+        if not options['all']:
+            parts = parts.filter(cover_hash='')
+        built = failed = 0
+        for part in parts.only('pk', 'cover').iterator(chunk_size=200):
+            try:
+                cover_hash = covers.render_derivatives(part.cover.path)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f"{part.cover.name}: {error}")
+                continue
+            # update() so the save() change detection and signals are skipped, updated_at
+            # is set by hand as it is part of the cached part card key
+            models.PartService.objects.filter(pk=part.pk).update(cover_hash=cover_hash, updated_at=timezone.now())
+            built += 1
+        if built:
+            # cached catalog pages still point at the original covers
+            catalog_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(f"Built derivatives for {built} covers, {failed} failed."))
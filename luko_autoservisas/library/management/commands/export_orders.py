@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from ... import exports, forms
+
+
+class Command(BaseCommand):
+    help = "Streams service orders with their lines, car and customer as CSV or JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', default='csv', choices=sorted(exports.STREAMS))
+        parser.add_argument('--date-from', help="YYYY-MM-DD, inclusive.")
+        parser.add_argument('--date-to', help="YYYY-MM-DD, inclusive.")
+        parser.add_argument('--status', help="Order status number.")
+        parser.add_argument('--min-total', help="Smallest order total, inclusive.")
+        parser.add_argument('--max-total', help="Largest order total, inclusive.")
+        parser.add_argument('--output', help="File to write, defaults to standard output.")
+
+    def handle(self, *args, **options):
+        form = forms.OrderExportForm({
+            'format': options['format'],
+            'date_from': options['date_from'],
+            'date_to': options['date_to'],
+            'status': options['status'],
+            'min_total': options['min_total'],
+            'max_total': options['max_total'],
+        })
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+        stream, content_type = exports.STREAMS[options['format']]
+        rows = exports.export_rows(
+            form.cleaned_data['date_from'], form.cleaned_data['date_to'], form.cleaned_data['status'],
+            form.cleaned_data['min_total'], form.cleaned_data['max_total'],
+        )
+        if not options['output']:
+            for chunk in stream(rows):
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            for chunk in stream(rows):
+                output.write(chunk)
@@ -0,0 +1,169 @@
+import csv
+import json
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from ... import brands, car_models, catalog_cache, models, stats
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as catalog_file:
+        yield from csv.DictReader(catalog_file)
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as catalog_file:
+        for line in catalog_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class PartServiceImporter:
+    """Matches parts on name. The name is not unique, a name that several
+    parts share is reported and left alone rather than guessing which to update.
+    """
+    model = models.PartService
+    update_fields = ['price', 'description', 'updated_at']
+
+    def parse(self, row):
+        name = (row.get('name') or '').strip()
+        if not name:
+            raise ValueError("name is required")
+        try:
+            price = Decimal(str(row['price']).strip()).quantize(Decimal('0.01'))
+        except (KeyError, InvalidOperation):
+            raise ValueError(f"invalid price {row.get('price')!r}")
+        return name[:50], {'price': price, 'description': (row.get('description') or '').strip()}
+
+    def existing(self, keys):
+        found = defaultdict(list)
+        for part in self.model.objects.filter(name__in=keys):
+            found[part.name].append(part)
+        return found
+
+    def build(self, key, values):
+        return self.model(name=key, **values)
+
+
+class CarModelImporter:
+    model = models.CarModel
+    update_fields = []
+
+    def parse(self, row):
+        brand = (row.get('brand') or '').strip()
+        car_model = (row.get('model') or '').strip()
+        try:
+            year = int(row['year'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"invalid year {row.get('year')!r}")
+        if not brand or not car_model:
+            raise ValueError("brand and model are required")
+        return (brand[:50], car_model[:50], year), {}
+
+    def existing(self, keys):
+        brands = {brand for brand, car_model, year in keys}
+        found = defaultdict(list)
+        for car_model in self.model.objects.filter(brand__in=brands, model__in={key[1] for key in keys}):
+            key = (car_model.brand, car_model.model, car_model.year)
+            if key in keys:
+                found[key].append(car_model)
+        return found
+
+    def build(self, key, values):
+        brand, car_model, year = key
+        return self.model(brand=brand, model=car_model, year=year)
+
+
+IMPORTERS = {
+    'parts': PartServiceImporter,
+    'car_models': CarModelImporter,
+}
+
+
+class Command(BaseCommand):
+    help = "Streams a CSV or JSON lines catalog file and upserts PartService or CarModel rows in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Parse and match rows without writing.")
+
+    def handle(self, *args, **options):
+        importer = IMPORTERS[options['kind']]()
+        file_format = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.json')) else 'csv')
+        reader = read_jsonl if file_format == 'jsonl' else read_csv
+        self.totals = {'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'ambiguous': 0, 'invalid': 0}
+        started = time.monotonic()
+        try:
+            for batch in batches(reader(options['path']), options['batch_size']):
+                self.import_batch(importer, batch, options['dry_run'])
+                self.report(started)
+        except FileNotFoundError as error:
+            raise CommandError(error)
+        if not options['dry_run'] and (self.totals['created'] or self.totals['updated']):
+            # bulk_create and bulk_update send no signals
+            stats.rebuild()
+            catalog_cache.invalidate()
+            car_models.invalidate()
+            brands.invalidate()
+        self.report(started, final=True)
+
+    def import_batch(self, importer, batch, dry_run):
+        parsed = {}
+        for row in batch:
+            self.totals['rows'] += 1
+            try:
+                key, values = importer.parse(row)
+            except ValueError as error:
+                self.totals['invalid'] += 1
+                self.stderr.write(f"row {self.totals['rows']}: {error}")
+                continue
+            # the last row wins when a key repeats inside a batch
+            parsed[key] = values
+        existing = importer.existing(set(parsed))
+        to_create, to_update = [], []
+        for key, values in parsed.items():
+            instances = existing.get(key, [])
+            if not instances:
+                to_create.append(importer.build(key, values))
+                continue
+            if len(instances) > 1 and importer.update_fields:
+                self.totals['ambiguous'] += 1
+                self.stderr.write(f"{key}: {len(instances)} rows have this key, none updated")
+                continue
+            # duplicate car models have nothing to update, any of them is the match
+            instance = instances[0]
+            if any(getattr(instance, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(instance, field, value)
+                if 'updated_at' in importer.update_fields:
+                    # bulk_update skips auto_now, cached part cards are keyed on it
+                    instance.updated_at = timezone.now()
+                to_update.append(instance)
+            else:
+                self.totals['unchanged'] += 1
+        if not dry_run:
+            with transaction.atomic():
+                importer.model.objects.bulk_create(to_create)
+                if to_update:
+                    importer.model.objects.bulk_update(to_update, importer.update_fields)
+        self.totals['created'] += len(to_create)
+        self.totals['updated'] += len(to_update)
+
+    def report(self, started, final=False):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        summary = ", ".join(f"{name} {count}" for name, count in self.totals.items())
+        line = f"{summary} ({self.totals['rows'] / elapsed:.0f} rows/s)"
+        self.stdout.write(self.style.SUCCESS(line) if final else line)
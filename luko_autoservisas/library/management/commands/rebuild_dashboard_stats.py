@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from ... import stats
+
+
+class Command(BaseCommand):
+    help = "Recounts the home page statistics from scratch."
+
+    def handle(self, *args, **options):
+        counters = stats.rebuild()
+        for name, value in counters.items():
+            self.stdout.write(f"{name}: {value}")
+        self.stdout.write(self.style.SUCCESS("Dashboard statistics rebuilt."))
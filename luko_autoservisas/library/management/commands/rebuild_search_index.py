@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from ... import models, search
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the service order search index from scratch."
+
+    def handle(self, *args, **options):
+        models.OrderSearchToken.objects.all().delete()
+        order_ids = models.ServiceOrder.objects.order_by('pk').values_list('pk', flat=True)
+        written = search.reindex_orders(order_ids.iterator())
+        self.stdout.write(self.style.SUCCESS(f"Indexed {order_ids.count()} orders, {written} tokens."))
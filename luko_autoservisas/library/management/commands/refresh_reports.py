@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand
+from ... import reports
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the daily report rollups for the days whose orders changed since the last run."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rebuild every day, not only the changed ones.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        days = reports.refresh(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed {days} days in {time.monotonic() - started:.2f}s."
+        ))
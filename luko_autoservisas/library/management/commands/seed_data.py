@@ -0,0 +1,177 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from ... import brands, car_models as car_model_index, models, orders, reports, reviews, search, stats
+
+BRANDS = {
+    'Audi': ['A3', 'A4', 'A6', 'Q5', 'Q7'],
+    'BMW': ['320', '520', 'X3', 'X5'],
+    'Volkswagen': ['Golf', 'Passat', 'Touran', 'Tiguan'],
+    'Toyota': ['Corolla', 'Avensis', 'RAV4', 'Prius'],
+    'Opel': ['Astra', 'Vectra', 'Zafira', 'Insignia'],
+    'Ford': ['Focus', 'Mondeo', 'Galaxy', 'Fiesta'],
+    'Volvo': ['V40', 'V70', 'XC60', 'XC90'],
+    'Skoda': ['Octavia', 'Fabia', 'Superb'],
+    'Renault': ['Megane', 'Laguna', 'Clio'],
+    'Peugeot': ['307', '308', '407', '508'],
+}
+PARTS = [
+    'Oil change', 'Oil filter', 'Air filter', 'Cabin filter', 'Fuel filter', 'Brake pads',
+    'Brake discs', 'Brake fluid', 'Timing belt', 'Water pump', 'Spark plugs', 'Glow plugs',
+    'Battery', 'Alternator', 'Starter', 'Clutch kit', 'Shock absorber', 'Wheel bearing',
+    'Tie rod end', 'Ball joint', 'Wiper blades', 'Headlight bulb', 'Coolant', 'Diagnostics',
+    'Wheel alignment', 'Tyre change', 'Air conditioning service', 'Exhaust repair',
+]
+VARIANTS = ['', 'front', 'rear', 'left', 'right', 'premium', 'economy', 'OEM', 'labour']
+COLORS = ['black', 'white', 'silver', 'grey', 'blue', 'red', 'green']
+FIRST_NAMES = ['Jonas', 'Petras', 'Tomas', 'Lukas', 'Mantas', 'Ona', 'Ieva', 'Rasa', 'Greta', 'Agne']
+LAST_NAMES = ['Kazlauskas', 'Petrauskas', 'Jankauskas', 'Stankevicius', 'Vasiliauskas', 'Zukauskas']
+REVIEWS = ['Fast and fair price.', 'Good work, will come back.', 'Took longer than promised.', 'Excellent.']
+
+
+def popularity(rng, size, skew=1.5):
+    """Cumulative heavy tailed weights: a few popular parts, loyal customers, common models."""
+    total = 0
+    cumulative = []
+    for number in range(size):
+        total += rng.paretovariate(skew)
+        cumulative.append(total)
+    return cumulative
+
+
+class Command(BaseCommand):
+    help = "Fills the database with realistic synthetic users, cars, parts, orders and reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--car-models', type=int, default=300)
+        parser.add_argument('--parts', type=int, default=500)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--reviews', type=int, default=3000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            car_models = self.create_car_models(options['car_models'])
+            parts = self.create_parts(options['parts'])
+            cars = self.create_cars(users, car_models)
+            order_ids = self.create_orders(cars, parts, options['orders'])
+            self.create_reviews(users, parts, options['reviews'])
+        # bulk_create skips the signals keeping these up to date
+        search.reindex_orders(order_ids)
+        orders.refresh_totals(order_ids)
+        stats.rebuild()
+        car_model_index.invalidate()
+        brands.invalidate()
+        reviews.refresh([part.pk for part in parts])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} users, {len(car_models)} car models, {len(parts)} parts, "
+            f"{len(cars)} cars, {len(order_ids)} orders and {options['reviews']} reviews."
+        ))
+
+    def create_users(self, count):
+        # hashing once keeps seeding fast, every synthetic user logs in with "slaptazodis"
+        password = make_password('slaptazodis')
+        # numbering after the newest user keeps repeated runs from colliding
+        offset = models.User.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        users = [
+            models.User(
+                username=f"customer{offset + number}",
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                email=f"customer{offset + number}@example.com",
+                password=password,
+            )
+            for number in range(1, count + 1)
+        ]
+        return models.User.objects.bulk_create(users, batch_size=self.batch_size)
+
+    def create_car_models(self, count):
+        car_models = []
+        for number in range(count):
+            brand = self.rng.choice(list(BRANDS))
+            car_models.append(models.CarModel(
+                brand=brand, model=self.rng.choice(BRANDS[brand]), year=self.rng.randint(1998, 2023),
+            ))
+        return models.CarModel.objects.bulk_create(car_models, batch_size=self.batch_size)
+
+    def create_parts(self, count):
+        parts = []
+        for number in range(count):
+            name = f"{PARTS[number % len(PARTS)]} {VARIANTS[(number // len(PARTS)) % len(VARIANTS)]}".strip()
+            if number >= len(PARTS) * len(VARIANTS):
+                name = f"{name} {number}"
+            price = Decimal(self.rng.lognormvariate(3.5, 0.8)).quantize(Decimal('0.01'))
+            parts.append(models.PartService(name=name[:50], price=price, description=f"{name} for most cars."))
+        return models.PartService.objects.bulk_create(parts, batch_size=self.batch_size)
+
+    def create_cars(self, users, car_models):
+        model_weights = popularity(self.rng, len(car_models))
+        cars = []
+        for user in users:
+            # most customers have one car, some fleets have many
+            for number in range(min(int(self.rng.paretovariate(2.5)), 10)):
+                cars.append(models.Car(
+                    customer=user,
+                    car_model=self.rng.choices(car_models, cum_weights=model_weights)[0],
+                    plate=f"{''.join(self.rng.choices('ABCDEFGHJKLMNPRSTUVZ', k=3))}{self.rng.randint(0, 999):03}",
+                    vin=''.join(self.rng.choices('ABCDEFGHJKLMNPRSTUVWXYZ0123456789', k=17)),
+                    color=self.rng.choice(COLORS),
+                ))
+        return models.Car.objects.bulk_create(cars, batch_size=self.batch_size)
+
+    def create_orders(self, cars, parts, count):
+        today = date.today()
+        car_weights = popularity(self.rng, len(cars))
+        part_weights = popularity(self.rng, len(parts), 1.1)
+        order_ids = []
+        for start in range(0, count, self.batch_size):
+            orders = [
+                models.ServiceOrder(
+                    car=self.rng.choices(cars, cum_weights=car_weights)[0],
+                    order_status=self.rng.choices(range(5), weights=(10, 5, 3, 2, 80))[0],
+                )
+                for number in range(min(self.batch_size, count - start))
+            ]
+            models.ServiceOrder.objects.bulk_create(orders)
+            # date is auto_now, bulk_update writes the spread out dates as given
+            for order in orders:
+                order.date = today - timedelta(days=int(self.rng.expovariate(1 / 365)))
+            models.ServiceOrder.objects.bulk_update(orders, ['date'])
+            reports.mark_days(order.date for order in orders)
+            lines = []
+            for order in orders:
+                for number in range(max(1, min(int(self.rng.lognormvariate(1.2, 0.6)), 15))):
+                    part = self.rng.choices(parts, cum_weights=part_weights)[0]
+                    quantity = self.rng.choices((1, 2, 4), weights=(80, 15, 5))[0]
+                    lines.append(models.OrderLine(
+                        order=order, part_service=part, quantity=quantity, price=part.price * quantity,
+                    ))
+            models.OrderLine.objects.bulk_create(lines, batch_size=self.batch_size)
+            order_ids.extend(order.pk for order in orders)
+        return order_ids
+
+    def create_reviews(self, users, parts, count):
+        now = timezone.now()
+        part_weights = popularity(self.rng, len(parts), 1.1)
+        for start in range(0, count, self.batch_size):
+            reviews = [
+                models.PartServiceReview(
+                    partservice=self.rng.choices(parts, cum_weights=part_weights)[0],
+                    reviewer=self.rng.choice(users),
+                    content=self.rng.choice(REVIEWS),
+                )
+                for number in range(min(self.batch_size, count - start))
+            ]
+            models.PartServiceReview.objects.bulk_create(reviews)
+            for review in reviews:
+                review.created_at = now - timedelta(minutes=int(self.rng.expovariate(1 / 50000)))
+            models.PartServiceReview.objects.bulk_update(reviews, ['created_at'])
@@ -0,0 +1,29 @@
+import tempfile
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand
+from ... import sqlite
+
+
+class Command(BaseCommand):
+    help = "Writes orders from many threads into a scratch SQLite file, with and without the connection setup."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--transactions', type=int, default=25, help="Transactions per worker.")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            for configured in (False, True):
+                started = time.monotonic()
+                results = sqlite.stress(
+                    Path(directory) / f"stress_{configured}.sqlite3",
+                    options['workers'], options['transactions'], configured,
+                )
+                label = 'configured' if configured else 'defaults'
+                self.stdout.write(
+                    f"{label:<11} committed {results['committed']}, locked {results['locked']} "
+                    f"({time.monotonic() - started:.2f}s)"
+                )
+        style = self.style.SUCCESS if not results['locked'] else self.style.ERROR
+        self.stdout.write(style(f"{results['locked']} lock errors with the connection setup."))
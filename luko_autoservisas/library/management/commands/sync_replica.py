@@ -0,0 +1,26 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from ... import routers
+
+
+class Command(BaseCommand):
+    help = "Copies the default SQLite database into the replica file read by the read-only pages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replica', default='replica', help="Replica alias, defaults to replica.")
+
+    def handle(self, *args, **options):
+        alias = options['replica']
+        if alias not in settings.DATABASES or alias == DEFAULT_DB_ALIAS:
+            raise CommandError(f"No replica database {alias!r} in DATABASES.")
+        source = connections[DEFAULT_DB_ALIAS].settings_dict
+        target = connections[alias].settings_dict
+        if source['ENGINE'] != 'django.db.backends.sqlite3' or target['ENGINE'] != source['ENGINE']:
+            raise CommandError("sync_replica only copies SQLite databases.")
+        started = time.monotonic()
+        routers.sync_replica(source['NAME'], target['NAME'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Copied {source['NAME']} to {target['NAME']} in {time.monotonic() - started:.2f}s."
+        ))
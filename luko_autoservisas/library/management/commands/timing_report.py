@@ -0,0 +1,47 @@
+import json
+from collections import defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ...benchmark import percentile
+
+
+class Command(BaseCommand):
+    help = "Summarizes the request timing log into the slowest routes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=None, help="Defaults to the REQUEST_TIMING_LOG setting.")
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument('--sort', default='p95_ms', choices=('p95_ms', 'total_ms', 'queries', 'duplicates'))
+
+    def handle(self, *args, **options):
+        path = options['log'] or settings.REQUEST_TIMING_LOG
+        requests = defaultdict(list)
+        try:
+            with open(path, encoding='utf-8') as log_file:
+                for line in log_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    requests[entry.get('route') or entry['path']].append(entry)
+        except FileNotFoundError:
+            raise CommandError(f"No timing log at {path}, is REQUEST_TIMING enabled?")
+        summaries = []
+        for route, entries in requests.items():
+            durations = sorted(entry['duration_ms'] for entry in entries)
+            summaries.append({
+                'route': route,
+                'requests': len(entries),
+                'p50_ms': percentile(durations, 0.5),
+                'p95_ms': percentile(durations, 0.95),
+                'total_ms': round(sum(durations), 1),
+                'queries': round(sum(entry['queries'] for entry in entries) / len(entries), 1),
+                'duplicates': round(sum(entry['duplicate_queries'] for entry in entries) / len(entries), 1),
+                'sql_ms': round(sum(entry['sql_ms'] for entry in entries) / len(entries), 1),
+                'template_ms': round(sum(entry['template_ms'] for entry in entries) / len(entries), 1),
+            })
+        summaries.sort(key=lambda summary: summary[options['sort']], reverse=True)
+        columns = ('requests', 'p50_ms', 'p95_ms', 'total_ms', 'queries', 'duplicates', 'sql_ms', 'template_ms')
+        self.stdout.write(f"{'route':<24}" + "".join(f"{column:>12}" for column in columns))
+        for summary in summaries[:options['top']]:
+            self.stdout.write(f"{summary['route']:<24}" + "".join(f"{summary[column]:>12}" for column in columns))
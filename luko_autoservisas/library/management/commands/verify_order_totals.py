@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from ... import orders
+
+
+class Command(BaseCommand):
+    help = "Checks the stored service order totals against their lines and optionally repairs them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help="Recalculate the orders that are off.")
+
+    def handle(self, *args, **options):
+        stale = list(orders.stale_totals())
+        for order_id, total_amount, line_count, line_total, lines_counted in stale:
+            self.stdout.write(
+                f"order {order_id}: stored {total_amount} in {line_count} lines, "
+                f"lines sum to {line_total} in {lines_counted}"
+            )
+        if not stale:
+            self.stdout.write(self.style.SUCCESS("All order totals match their lines."))
+        elif options['repair']:
+            repaired = orders.refresh_totals([row[0] for row in stale])
+            self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} orders."))
+        else:
+            raise CommandError(f"{len(stale)} orders have stale totals, run with --repair to fix them.")
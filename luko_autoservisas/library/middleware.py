@@ -0,0 +1,104 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger('library.timing')
+current_timing = ContextVar('current_timing', default=None)
+
+
+class RequestTiming:
+    def __init__(self):
+        self.queries = Counter()
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - started
+            self.queries[sql] += 1
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicate_queries(self):
+        # the same statement run again with other parameters, the N+1 signature
+        return sum(count - 1 for count in self.queries.values() if count > 1)
+
+
+def instrument_templates():
+    """Times top level template renders, {% include %} renders are counted inside them."""
+    render = django_backend.Template.render
+    if getattr(render, 'timed', False):
+        return
+
+    def timed_render(self, context=None, request=None):
+        timing = current_timing.get()
+        if timing is None:
+            return render(self, context, request)
+        started = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            timing.template_seconds += time.perf_counter() - started
+
+    timed_render.timed = True
+    django_backend.Template.render = timed_render
+
+
+class RequestTimingMiddleware:
+    """Adds Server-Timing headers and a JSON log line with SQL and template costs per request.
+
+    Opt-in with the REQUEST_TIMING setting, it works without DEBUG.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_TIMING', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        instrument_templates()
+
+    def __call__(self, request):
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing))
+                response = self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        total_ms = (time.perf_counter() - started) * 1000
+        sql_ms = timing.sql_seconds * 1000
+        template_ms = timing.template_seconds * 1000
+        response['Server-Timing'] = ", ".join([
+            f'db;dur={sql_ms:.1f};desc="{timing.query_count} queries"',
+            f'dup;desc="{timing.duplicate_queries} duplicate queries"',
+            f'tpl;dur={template_ms:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'route': match.view_name if match else None,
+            'status': response.status_code,
+            'duration_ms': round(total_ms, 2),
+            'queries': timing.query_count,
+            'sql_ms': round(sql_ms, 2),
+            'duplicate_queries': timing.duplicate_queries,
+            'template_ms': round(template_ms, 2),
+        }))
+        return response
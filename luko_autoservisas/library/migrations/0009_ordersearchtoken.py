@@ -0,0 +1,39 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_search_tokens(apps, schema_editor):
+    from library import search
+    ServiceOrder = apps.get_model('library', 'ServiceOrder')
+    search.reindex_orders(
+        ServiceOrder.objects.order_by('pk').values_list('pk', flat=True),
+        ServiceOrder,
+        apps.get_model('library', 'OrderSearchToken'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0008_partservicereview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=150, verbose_name='token')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(0, 'order id'), (1, 'plate'), (2, 'customer'), (3, 'part or service'), (4, 'date')], verbose_name='kind')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='library.serviceorder', verbose_name='order')),
+            ],
+            options={
+                'verbose_name': 'order search token',
+                'verbose_name_plural': 'order search tokens',
+                'indexes': [models.Index(fields=['token', 'order'], name='library_ost_token_order_idx')],
+            },
+        ),
+        migrations.RunPython(fill_search_tokens, migrations.RunPython.noop),
+    ]
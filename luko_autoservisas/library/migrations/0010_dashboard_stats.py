@@ -0,0 +1,62 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:45
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_dashboard_stats(apps, schema_editor):
+    CarModel = apps.get_model('library', 'CarModel')
+    PartService = apps.get_model('library', 'PartService')
+    ServiceOrder = apps.get_model('library', 'ServiceOrder')
+    DashboardCounter = apps.get_model('library', 'DashboardCounter')
+    BrandSummary = apps.get_model('library', 'BrandSummary')
+    counters = {
+        'car_models': CarModel.objects.count(),
+        'parts': PartService.objects.count(),
+        'orders': ServiceOrder.objects.count(),
+        'completed_orders': ServiceOrder.objects.filter(order_status=4).count(),
+    }
+    DashboardCounter.objects.bulk_create(
+        DashboardCounter(name=name, value=value) for name, value in counters.items()
+    )
+    BrandSummary.objects.bulk_create(
+        BrandSummary(brand=row['brand'], model_count=row['model_count'])
+        for row in CarModel.objects.order_by().values('brand').annotate(model_count=Count('pk'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0009_ordersearchtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BrandSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('brand', models.CharField(max_length=50, unique=True, verbose_name='brand')),
+                ('model_count', models.PositiveIntegerField(default=0, verbose_name='model count')),
+            ],
+            options={
+                'verbose_name': 'brand summary',
+                'verbose_name_plural': 'brand summaries',
+                'ordering': ['brand'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='name')),
+                ('value', models.BigIntegerField(default=0, verbose_name='value')),
+            ],
+            options={
+                'verbose_name': 'dashboard counter',
+                'verbose_name_plural': 'dashboard counters',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RunPython(fill_dashboard_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0010_dashboard_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partservice',
+            name='cover_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='cover hash'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0011_partservice_cover_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partservice',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='updated at'),
+        ),
+    ]
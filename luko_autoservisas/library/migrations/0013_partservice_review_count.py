@@ -0,0 +1,37 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:59
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def fill_review_counts(apps, schema_editor):
+    PartService = apps.get_model('library', 'PartService')
+    PartServiceReview = apps.get_model('library', 'PartServiceReview')
+    summaries = PartServiceReview.objects.order_by().values('partservice').annotate(
+        count=Count('pk'), last=Max('created_at'),
+    )
+    for summary in summaries:
+        PartService.objects.filter(pk=summary['partservice']).update(
+            review_count=summary['count'], last_reviewed_at=summary['last'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0012_partservice_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partservice',
+            name='last_reviewed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='last reviewed at'),
+        ),
+        migrations.AddField(
+            model_name='partservice',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='review count'),
+        ),
+        migrations.RunPython(fill_review_counts, migrations.RunPython.noop),
+    ]
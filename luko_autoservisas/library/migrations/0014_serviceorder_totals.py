@@ -0,0 +1,33 @@
+# Generated by Django 4.2.5 on 2026-10-18 07:01
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_order_totals(apps, schema_editor):
+    ServiceOrder = apps.get_model('library', 'ServiceOrder')
+    OrderLine = apps.get_model('library', 'OrderLine')
+    sums = OrderLine.objects.order_by().values('order').annotate(total=Sum('price'), count=Count('pk'))
+    for row in sums.iterator():
+        ServiceOrder.objects.filter(pk=row['order']).update(total_amount=row['total'], line_count=row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0013_partservice_review_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serviceorder',
+            name='line_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='line count'),
+        ),
+        migrations.AddField(
+            model_name='serviceorder',
+            name='total_amount',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='total amount'),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 4.2.5 on 2026-10-18 07:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def mark_order_days(apps, schema_editor):
+    # the first refresh_reports run builds the rollups for every existing day
+    ServiceOrder = apps.get_model('library', 'ServiceOrder')
+    ReportDirtyDay = apps.get_model('library', 'ReportDirtyDay')
+    days = ServiceOrder.objects.order_by().values_list('date', flat=True).distinct()
+    ReportDirtyDay.objects.bulk_create(ReportDirtyDay(day=day) for day in days.iterator())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0014_serviceorder_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBrandRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='day')),
+                ('brand', models.CharField(max_length=50, verbose_name='brand')),
+                ('order_status', models.PositiveSmallIntegerField(choices=[(0, 'pending'), (1, 'awaiting payment'), (2, 'cancelled'), (3, 'declined'), (4, 'completed')], verbose_name='status')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='order count')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='revenue')),
+            ],
+            options={
+                'verbose_name': 'daily brand rollup',
+                'verbose_name_plural': 'daily brand rollups',
+                'ordering': ['day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyPartRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='day')),
+                ('order_status', models.PositiveSmallIntegerField(choices=[(0, 'pending'), (1, 'awaiting payment'), (2, 'cancelled'), (3, 'declined'), (4, 'completed')], verbose_name='status')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='quantity')),
+                ('line_count', models.PositiveIntegerField(default=0, verbose_name='line count')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='revenue')),
+            ],
+            options={
+                'verbose_name': 'daily part rollup',
+                'verbose_name_plural': 'daily part rollups',
+                'ordering': ['day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyStatusRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='day')),
+                ('order_status', models.PositiveSmallIntegerField(choices=[(0, 'pending'), (1, 'awaiting payment'), (2, 'cancelled'), (3, 'declined'), (4, 'completed')], verbose_name='status')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='order count')),
+                ('line_count', models.PositiveIntegerField(default=0, verbose_name='line count')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='revenue')),
+            ],
+            options={
+                'verbose_name': 'daily status rollup',
+                'verbose_name_plural': 'daily status rollups',
+                'ordering': ['day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReportDirtyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='day')),
+            ],
+            options={
+                'verbose_name': 'report dirty day',
+                'verbose_name_plural': 'report dirty days',
+                'ordering': ['day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailystatusrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'order_status'), name='library_dsr_day_status_uniq'),
+        ),
+        migrations.AddField(
+            model_name='dailypartrollup',
+            name='part_service',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='library.partservice', verbose_name='part service'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailybrandrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'brand', 'order_status'), name='library_dbr_day_brand_status_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailypartrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'part_service', 'order_status'), name='library_dpr_day_part_status_uniq'),
+        ),
+        migrations.RunPython(mark_order_days, migrations.RunPython.noop),
+    ]
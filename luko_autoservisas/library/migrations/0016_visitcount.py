@@ -0,0 +1,27 @@
+# Generated by Django 4.2.5 on 2026-10-18 07:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0015_report_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('visitor', models.CharField(max_length=50, unique=True, verbose_name='visitor')),
+                ('count', models.PositiveBigIntegerField(default=0, verbose_name='count')),
+                ('last_visit', models.DateTimeField(blank=True, null=True, verbose_name='last visit')),
+            ],
+            options={
+                'verbose_name': 'visit count',
+                'verbose_name_plural': 'visit counts',
+                'ordering': ['visitor'],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.5 on 2026-10-18 07:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('library', '0016_visitcount'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='car',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='customer'),
+        ),
+        migrations.AlterField(
+            model_name='orderline',
+            name='order',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='library.serviceorder', verbose_name='order'),
+        ),
+        migrations.AlterField(
+            model_name='serviceorder',
+            name='car',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='library.car', verbose_name='car'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['customer', 'plate'], name='library_car_customer_plate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderline',
+            index=models.Index(fields=['order', 'part_service'], name='library_ol_order_part_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serviceorder',
+            index=models.Index(fields=['car', 'date'], name='library_so_car_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serviceorder',
+            index=models.Index(fields=['order_status', 'date'], name='library_so_status_date_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.5 on 2026-10-18 07:33
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0017_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='orderline',
+            options={'ordering': ['order_id'], 'verbose_name': 'order_line', 'verbose_name_plural': 'order_lines'},
+        ),
+    ]
@@ -1,8 +1,11 @@
 from datetime import date
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import Prefetch
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
+from . import catalog_cache, covers
 
 User = get_user_model()
 
@@ -25,7 +28,8 @@ class CarModel(models.Model):
     
 
 class Car(models.Model):
-    customer = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_("customer"))
+    # indexed together with the plate in Meta.indexes
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_("customer"), db_index=False)
     car_model = models.ForeignKey(
         CarModel, 
         verbose_name=_("car model"),
@@ -40,6 +44,10 @@ class Car(models.Model):
         verbose_name = _("car")
         verbose_name_plural = _("cars")
         ordering = ['customer', 'plate']
+        indexes = [
+            # a customer's cars in plate order, the my cars page
+            models.Index(fields=['customer', 'plate'], name='library_car_customer_plate_idx'),
+        ]
 
     def __str__(self):
         return f"{self.customer}, {self.car_model}, {self.plate}, {self.vin}, {self.color}"
@@ -57,23 +65,51 @@ ORDER_STATUS = (
 )
 
 
+class ServiceOrderQuerySet(models.QuerySet):
+    def with_lines(self):
+        # all lines of the listed orders, with their part, in one prefetch
+        return self.prefetch_related(
+            Prefetch('lines', queryset=OrderLine.objects.select_related('part_service').order_by('pk')),
+        )
+
+    def with_details(self):
+        # car, customer and car model come in the same query and the lines in
+        # one prefetch, so the number of queries does not depend on how many
+        # orders are listed; the total is stored on the order
+        return self.select_related('car__customer', 'car__car_model').with_lines()
+
+
 class ServiceOrder(models.Model):
     car = models.ForeignKey(Car, 
     verbose_name=_("car"), 
     on_delete=models.CASCADE,
     related_name='orders',
-    db_index=True,
+    # indexed together with the date in Meta.indexes
+    db_index=False,
     null=False
     )
     date = models.DateField(_("date"), auto_now=True, db_index=True)
     order_status = models.PositiveSmallIntegerField(
         _("status"), choices=ORDER_STATUS, default=0,
     )
+    # sums of the order lines, kept up to date by the OrderLine signals and orders.refresh_totals()
+    total_amount = models.DecimalField(
+        _("total amount"), max_digits=12, decimal_places=2, default=0, db_index=True, editable=False,
+    )
+    line_count = models.PositiveIntegerField(_("line count"), default=0, editable=False)
+
+    objects = ServiceOrderQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("service_order")
         verbose_name_plural = _("service_orders")
         ordering = ['car']
+        indexes = [
+            # the orders of a car by date, also how a customer's orders are reached through their cars
+            models.Index(fields=['car', 'date'], name='library_so_car_date_idx'),
+            # orders in one status, optionally for a date range
+            models.Index(fields=['order_status', 'date'], name='library_so_status_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.car} {self.date}"
@@ -93,6 +129,10 @@ class PartService(models.Model):
     price = models.DecimalField(_("price"), max_digits=12, decimal_places=2)
     description = models.TextField(_("Description"), max_length=4000, default='', blank=True)
     cover = models.ImageField(_('nopart'), upload_to='part_covers', null=True, blank=True)
+    cover_hash = models.CharField(_("cover hash"), max_length=64, blank=True, default='', editable=False)
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+    review_count = models.PositiveIntegerField(_("review count"), default=0, editable=False)
+    last_reviewed_at = models.DateTimeField(_("last reviewed at"), null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = _("part_service")
@@ -105,6 +145,48 @@ class PartService(models.Model):
     def get_absolute_url(self):
         return reverse("part_service_detail", kwargs={"pk": self.pk})
 
+    def save(self, *args, **kwargs) -> None:
+        previous_cover = None
+        if self.pk:
+            previous_cover = PartService.objects.filter(pk=self.pk).values_list('cover', flat=True).first()
+        cover_changed = (self.cover.name or None) != (previous_cover or None)
+        if cover_changed:
+            self.cover_hash = ''
+        super().save(*args, **kwargs)
+        if cover_changed and self.cover:
+            self.cover_hash = covers.render_derivatives(self.cover.path)
+            self.updated_at = timezone.now()
+            PartService.objects.filter(pk=self.pk).update(cover_hash=self.cover_hash, updated_at=self.updated_at)
+            # post_save already ran, cached cards must not keep the old cover
+            catalog_cache.invalidate()
+
+    def cover_srcset(self, extension, sizes):
+        return covers.srcset(self.cover_hash, extension, sizes)
+
+    @property
+    def cover_card_url(self):
+        return covers.derivative_url(self.cover_hash, 'card', 'jpg')
+
+    @property
+    def cover_card_srcset_webp(self):
+        return self.cover_srcset('webp', ('card', 'detail'))
+
+    @property
+    def cover_card_srcset_jpg(self):
+        return self.cover_srcset('jpg', ('card', 'detail'))
+
+    @property
+    def cover_detail_url(self):
+        return covers.derivative_url(self.cover_hash, 'detail', 'jpg')
+
+    @property
+    def cover_detail_srcset_webp(self):
+        return self.cover_srcset('webp', ('detail', 'retina'))
+
+    @property
+    def cover_detail_srcset_jpg(self):
+        return self.cover_srcset('jpg', ('detail', 'retina'))
+
 
 class OrderLine(models.Model):
     order = models.ForeignKey(
@@ -112,7 +194,8 @@ class OrderLine(models.Model):
         verbose_name=_("order"), 
         on_delete=models.CASCADE,
         related_name='lines',
-        db_index=True,
+        # indexed together with the part in Meta.indexes
+        db_index=False,
     )
     part_service = models.ForeignKey(
         PartService, 
@@ -127,7 +210,12 @@ class OrderLine(models.Model):
     class Meta:
         verbose_name = _("order_line")
         verbose_name_plural = _("order_lines")
-        ordering = ['order']
+        # the column itself, ordering by 'order' would join the order and its car
+        ordering = ['order_id']
+        indexes = [
+            # the lines of an order with their parts, and whether an order has a part
+            models.Index(fields=['order', 'part_service'], name='library_ol_order_part_idx'),
+        ]
 
     def __str__(self):
         return f"{self.order} {self.part_service} {self.quantity} {self.price}"
@@ -165,4 +253,153 @@ class PartServiceReview(models.Model):
         return f"{self.partservice} review by {self.reviewer}"
 
     def get_absolute_url(self):
-        return reverse("partservicereview_detail", kwargs={"pk": self.pk})
\ No newline at end of file
+        return reverse("partservicereview_detail", kwargs={"pk": self.pk})
+
+
+SEARCH_TOKEN_KIND = (
+    (0, _('order id')),
+    (1, _('plate')),
+    (2, _('customer')),
+    (3, _('part or service')),
+    (4, _('date')),
+)
+
+
+class OrderSearchToken(models.Model):
+    order = models.ForeignKey(
+        ServiceOrder,
+        verbose_name=_("order"),
+        on_delete=models.CASCADE,
+        related_name='search_tokens',
+    )
+    token = models.CharField(_("token"), max_length=150)
+    kind = models.PositiveSmallIntegerField(_("kind"), choices=SEARCH_TOKEN_KIND)
+
+    class Meta:
+        verbose_name = _("order search token")
+        verbose_name_plural = _("order search tokens")
+        indexes = [
+            models.Index(fields=['token', 'order'], name='library_ost_token_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} {self.token}"
+
+
+class DashboardCounter(models.Model):
+    name = models.CharField(_("name"), max_length=50, unique=True)
+    value = models.BigIntegerField(_("value"), default=0)
+
+    class Meta:
+        verbose_name = _("dashboard counter")
+        verbose_name_plural = _("dashboard counters")
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class BrandSummary(models.Model):
+    brand = models.CharField(_("brand"), max_length=50, unique=True)
+    model_count = models.PositiveIntegerField(_("model count"), default=0)
+
+    class Meta:
+        verbose_name = _("brand summary")
+        verbose_name_plural = _("brand summaries")
+        ordering = ['brand']
+
+    def __str__(self):
+        return f"{self.brand} ({self.model_count})"
+
+
+class ReportDirtyDay(models.Model):
+    """A day whose orders changed since the report rollups were last refreshed."""
+    day = models.DateField(_("day"), unique=True)
+
+    class Meta:
+        verbose_name = _("report dirty day")
+        verbose_name_plural = _("report dirty days")
+        ordering = ['day']
+
+    def __str__(self):
+        return str(self.day)
+
+
+class DailyPartRollup(models.Model):
+    day = models.DateField(_("day"))
+    part_service = models.ForeignKey(
+        PartService,
+        verbose_name=_("part service"),
+        on_delete=models.CASCADE,
+        related_name='daily_rollups',
+    )
+    order_status = models.PositiveSmallIntegerField(_("status"), choices=ORDER_STATUS)
+    quantity = models.PositiveIntegerField(_("quantity"), default=0)
+    line_count = models.PositiveIntegerField(_("line count"), default=0)
+    revenue = models.DecimalField(_("revenue"), max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _("daily part rollup")
+        verbose_name_plural = _("daily part rollups")
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'part_service', 'order_status'], name='library_dpr_day_part_status_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.part_service_id} {self.revenue}"
+
+
+class DailyBrandRollup(models.Model):
+    day = models.DateField(_("day"))
+    brand = models.CharField(_("brand"), max_length=50)
+    order_status = models.PositiveSmallIntegerField(_("status"), choices=ORDER_STATUS)
+    order_count = models.PositiveIntegerField(_("order count"), default=0)
+    revenue = models.DecimalField(_("revenue"), max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _("daily brand rollup")
+        verbose_name_plural = _("daily brand rollups")
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'brand', 'order_status'], name='library_dbr_day_brand_status_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.brand} {self.revenue}"
+
+
+class DailyStatusRollup(models.Model):
+    day = models.DateField(_("day"))
+    order_status = models.PositiveSmallIntegerField(_("status"), choices=ORDER_STATUS)
+    order_count = models.PositiveIntegerField(_("order count"), default=0)
+    line_count = models.PositiveIntegerField(_("line count"), default=0)
+    revenue = models.DecimalField(_("revenue"), max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _("daily status rollup")
+        verbose_name_plural = _("daily status rollups")
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'order_status'], name='library_dsr_day_status_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.get_order_status_display()} {self.revenue}"
+
+
+class VisitCount(models.Model):
+    """Home page visits per visitor, written in batches by library.visits."""
+    visitor = models.CharField(_("visitor"), max_length=50, unique=True)
+    count = models.PositiveBigIntegerField(_("count"), default=0)
+    last_visit = models.DateTimeField(_("last visit"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("visit count")
+        verbose_name_plural = _("visit counts")
+        ordering = ['visitor']
+
+    def __str__(self):
+        return f"{self.visitor}: {self.count}"
@@ -0,0 +1,83 @@
+from decimal import Decimal
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from . import models, search, sqlite
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+# cancelled and declined orders are not counted as money spent
+UNPAID_STATUSES = (2, 3)
+
+
+@sqlite.immediate_atomic()
+def place_order(car: models.Car, lines) -> models.ServiceOrder:
+    """Creates an order with all its lines in one transaction.
+
+    lines is an iterable of (PartService, quantity) pairs, the line price is
+    the current part price multiplied by the quantity.
+    """
+    service_order = models.ServiceOrder.objects.create(car=car)
+    order_lines = models.OrderLine.objects.bulk_create([
+        models.OrderLine(
+            order=service_order,
+            part_service=part_service,
+            quantity=quantity,
+            price=part_service.price * quantity,
+        )
+        for part_service, quantity in lines
+    ])
+    # bulk_create sends no post_save, the lines are indexed and summed here instead
+    search.reindex_orders([service_order.pk])
+    service_order.total_amount = sum((line.price for line in order_lines), Decimal('0.00'))
+    service_order.line_count = len(order_lines)
+    models.ServiceOrder.objects.filter(pk=service_order.pk).update(
+        total_amount=service_order.total_amount, line_count=service_order.line_count,
+    )
+    return service_order
+
+
+def change_totals(order_id: int, amount, lines: int) -> None:
+    """Adds a line price difference to the stored order totals in place."""
+    if amount or lines:
+        models.ServiceOrder.objects.filter(pk=order_id).update(
+            total_amount=F('total_amount') + amount, line_count=F('line_count') + lines,
+        )
+
+
+def line_sums():
+    lines = models.OrderLine.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    return (
+        Coalesce(Subquery(lines.annotate(total=Sum('price')).values('total'), output_field=MONEY), 0,
+                 output_field=MONEY),
+        Coalesce(Subquery(lines.annotate(count=Count('pk')).values('count'), output_field=IntegerField()), 0),
+    )
+
+
+def stale_totals(order_ids=None):
+    """Yields (order id, stored total, stored count, line total, line count) for orders that are off.
+
+    Compared in Python, the database may sum the prices as floats.
+    """
+    total, count = line_sums()
+    orders = models.ServiceOrder.objects.order_by('pk')
+    if order_ids is not None:
+        orders = orders.filter(pk__in=order_ids)
+    rows = orders.annotate(line_total=total, lines_counted=count).values_list(
+        'pk', 'total_amount', 'line_count', 'line_total', 'lines_counted',
+    )
+    for row in rows.iterator(chunk_size=2000):
+        if row[1] != row[3] or row[2] != row[4]:
+            yield row
+
+
+def refresh_totals(order_ids=None, batch_size=500) -> int:
+    """Recalculates the stored totals from the lines, after bulk writes or for repairs."""
+    total, count = line_sums()
+    if order_ids is None:
+        return models.ServiceOrder.objects.update(total_amount=total, line_count=count)
+    order_ids = list(order_ids)
+    updated = 0
+    for start in range(0, len(order_ids), batch_size):
+        updated += models.ServiceOrder.objects.filter(pk__in=order_ids[start:start + batch_size]).update(
+            total_amount=total, line_count=count,
+        )
+    return updated
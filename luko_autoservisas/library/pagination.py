@@ -0,0 +1,183 @@
+import json
+from collections.abc import Sequence
+from datetime import date
+from decimal import Decimal
+from functools import cached_property
+from django.core import signing
+from django.db.models import Q, QuerySet
+
+SIGNING_SALT = 'library.pagination'
+LAST = 'last'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_key_value(value):
+    # full precision, DjangoJSONEncoder cuts datetimes to milliseconds which
+    # would make the seek skip rows created within the same millisecond
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} can not be used as a cursor key")
+
+
+class CursorSerializer:
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'), default=encode_key_value).encode('latin-1')
+
+    def loads(self, data):
+        return json.loads(data.decode('latin-1'))
+
+
+class CursorPage(Sequence):
+    """Page of a keyset paginated queryset, usable by the pager includes like a Django Page."""
+    cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next:
+            return self.paginator.encode_cursor(self.object_list[-1], reverse=False)
+        return ''
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous:
+            return self.paginator.encode_cursor(self.object_list[0], reverse=True)
+        return ''
+
+
+class CursorPaginator:
+    """Keyset pagination: pages are found by seeking past the last seen sort key.
+
+    Unlike OFFSET the cost of a page does not depend on how deep it is, and the
+    total COUNT(*) is only run when count_total is set and the count is used.
+    The ordering must end with a unique field so the keys are never ambiguous.
+    """
+
+    def __init__(self, queryset: QuerySet, per_page: int, ordering=None, count_total=True):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering or queryset.query.order_by or queryset.model._meta.ordering)
+        self.count_total = count_total
+
+    @cached_property
+    def count(self):
+        if not self.count_total:
+            return None
+        return self.queryset.order_by().count()
+
+    def encode_cursor(self, obj, reverse: bool) -> str:
+        values = [getattr(obj, field.lstrip('-')) for field in self.ordering]
+        return signing.dumps(
+            {'v': values, 'r': reverse}, salt=SIGNING_SALT, serializer=CursorSerializer, compress=True,
+        )
+
+    def decode_cursor(self, cursor: str):
+        try:
+            data = signing.loads(cursor, salt=SIGNING_SALT, serializer=CursorSerializer)
+            values, reverse = data['v'], data['r']
+        except (signing.BadSignature, KeyError, TypeError, ValueError) as error:
+            raise InvalidCursor(cursor) from error
+        if len(values) != len(self.ordering):
+            raise InvalidCursor(cursor)
+        return values, reverse
+
+    def seek_filter(self, values, reverse: bool) -> Q:
+        # (a > x) OR (a = x AND b > y) OR ... with the comparison flipped for
+        # descending fields and when walking backwards
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def reversed_ordering(self):
+        return [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+
+    def plan(self, cursor=None):
+        """The row query for a cursor and the function turning its rows into a page.
+
+        Shared by page() and apage(), only fetching the rows differs.
+        """
+        if cursor == LAST:
+            def make_page(rows):
+                return CursorPage(rows[:self.per_page][::-1], self, False, len(rows) > self.per_page)
+            return self.queryset.order_by(*self.reversed_ordering())[:self.per_page + 1], make_page
+        if not cursor:
+            def make_page(rows):
+                return CursorPage(rows[:self.per_page], self, len(rows) > self.per_page, False)
+            return self.queryset.order_by(*self.ordering)[:self.per_page + 1], make_page
+        values, reverse = self.decode_cursor(cursor)
+        queryset = self.queryset.filter(self.seek_filter(values, reverse))
+        if reverse:
+            def make_page(rows):
+                return CursorPage(rows[:self.per_page][::-1], self, True, len(rows) > self.per_page)
+            return queryset.order_by(*self.reversed_ordering())[:self.per_page + 1], make_page
+
+        def make_page(rows):
+            return CursorPage(rows[:self.per_page], self, len(rows) > self.per_page, True)
+        return queryset.order_by(*self.ordering)[:self.per_page + 1], make_page
+
+    def page(self, cursor=None) -> CursorPage:
+        rows, make_page = self.plan(cursor)
+        return make_page(list(rows))
+
+    async def apage(self, cursor=None) -> CursorPage:
+        rows, make_page = self.plan(cursor)
+        return make_page([row async for row in rows])
+
+    def get_page(self, cursor=None) -> CursorPage:
+        """Like page(), but falls back to the first page on a broken or tampered cursor."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+    async def aget_page(self, cursor=None) -> CursorPage:
+        try:
+            return await self.apage(cursor)
+        except InvalidCursor:
+            return await self.apage()
+
+
+class CursorPaginationMixin:
+    """ListView mixin switching paginate_by pagination to keyset cursors."""
+    cursor_ordering = None
+    count_total = True
+
+    def get_cursor_ordering(self):
+        return self.cursor_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(
+            queryset, page_size, ordering=self.get_cursor_ordering(), count_total=self.count_total,
+        )
+        page = paginator.get_page(self.request.GET.get('cursor'))
+        return (paginator, page, page.object_list, page.has_other_pages())
@@ -0,0 +1,34 @@
+"""EXPLAIN QUERY PLAN checks for the queries a page runs.
+
+SQLite reports a table read without an index as "SCAN <table>"; reads
+through an index say "SEARCH" or "SCAN <table> USING ... INDEX". The tests
+capture the queries of each view and fail on the plain scans, so a missing
+index shows up before the table is big enough to notice.
+"""
+import re
+from django.db import DEFAULT_DB_ALIAS, connections
+
+FULL_SCAN = re.compile(r'^SCAN (?P<table>\w+)(?: AS \w+)?$')
+
+
+def explain(sql: str, params=(), using=DEFAULT_DB_ALIAS) -> list[str]:
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(queries, using=DEFAULT_DB_ALIAS, allowed=()) -> list[tuple[str, str]]:
+    """The (sql, plan step) pairs of captured queries that scan a whole table.
+
+    Tables in allowed may be scanned, for pages that list every row on purpose.
+    """
+    scans = []
+    for query in queries:
+        sql = query['sql']
+        if not sql.lstrip().upper().startswith('SELECT'):
+            continue
+        for step in explain(sql, using=using):
+            match = FULL_SCAN.match(step)
+            if match and match['table'] not in allowed:
+                scans.append((sql, step))
+    return scans
@@ -0,0 +1,139 @@
+from datetime import date
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from . import models
+
+# days rebuilt per transaction by refresh()
+BATCH_DAYS = 31
+
+
+def mark_days(days) -> None:
+    """Queues days for the next refresh, cheap enough to call on every order write."""
+    days = {day for day in days if day is not None}
+    if days:
+        models.ReportDirtyDay.objects.bulk_create(
+            [models.ReportDirtyDay(day=day) for day in days], ignore_conflicts=True,
+        )
+
+
+def mark_order_days(orders) -> None:
+    mark_days(orders.order_by().values_list('date', flat=True).distinct())
+
+
+def mark_all() -> None:
+    mark_order_days(models.ServiceOrder.objects.all())
+
+
+def rollup_parts(days):
+    rows = models.OrderLine.objects.filter(order__date__in=days).order_by().values(
+        'order__date', 'part_service', 'order__order_status',
+    ).annotate(quantity=Sum('quantity'), line_count=Count('pk'), revenue=Sum('price'))
+    return [
+        models.DailyPartRollup(
+            day=row['order__date'], part_service_id=row['part_service'], order_status=row['order__order_status'],
+            quantity=row['quantity'], line_count=row['line_count'], revenue=row['revenue'],
+        )
+        for row in rows
+    ]
+
+
+def rollup_brands(days):
+    # orders carry their own total since the totals are stored, no line join needed
+    rows = models.ServiceOrder.objects.filter(date__in=days).order_by().values(
+        'date', 'car__car_model__brand', 'order_status',
+    ).annotate(order_count=Count('pk'), revenue=Sum('total_amount'))
+    return [
+        models.DailyBrandRollup(
+            day=row['date'], brand=row['car__car_model__brand'], order_status=row['order_status'],
+            order_count=row['order_count'], revenue=row['revenue'],
+        )
+        for row in rows
+    ]
+
+
+def rollup_statuses(days):
+    rows = models.ServiceOrder.objects.filter(date__in=days).order_by().values('date', 'order_status').annotate(
+        order_count=Count('pk'), line_count=Sum('line_count'), revenue=Sum('total_amount'),
+    )
+    return [
+        models.DailyStatusRollup(
+            day=row['date'], order_status=row['order_status'],
+            order_count=row['order_count'], line_count=row['line_count'], revenue=row['revenue'],
+        )
+        for row in rows
+    ]
+
+
+ROLLUPS = (
+    (models.DailyPartRollup, rollup_parts),
+    (models.DailyBrandRollup, rollup_brands),
+    (models.DailyStatusRollup, rollup_statuses),
+)
+
+
+@transaction.atomic
+def refresh_days(days) -> None:
+    for model, build in ROLLUPS:
+        model.objects.filter(day__in=days).delete()
+        model.objects.bulk_create(build(days))
+    models.ReportDirtyDay.objects.filter(day__in=days).delete()
+
+
+def refresh(full=False) -> int:
+    """Rebuilds the rollups of the days marked as changed, or of every day with full.
+
+    Returns the number of days processed.
+    """
+    if full:
+        with transaction.atomic():
+            for model, build in ROLLUPS:
+                model.objects.all().delete()
+            mark_all()
+    days = list(models.ReportDirtyDay.objects.order_by('day').values_list('day', flat=True))
+    for start in range(0, len(days), BATCH_DAYS):
+        refresh_days(days[start:start + BATCH_DAYS])
+    return len(days)
+
+
+def month_range(month: date):
+    start = month.replace(day=1)
+    end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+def month_rows(model, month: date, fields, status=None):
+    start, end = month_range(month)
+    rows = model.objects.filter(day__gte=start, day__lt=end)
+    if status is not None:
+        rows = rows.filter(order_status=status)
+    return rows.order_by().values(*fields)
+
+
+def revenue_by_part(month: date, status=None, limit=50):
+    return list(month_rows(models.DailyPartRollup, month, ('part_service', 'part_service__name'), status).annotate(
+        quantity=Sum('quantity'), line_count=Sum('line_count'), revenue=Sum('revenue'),
+    ).order_by('-revenue', 'part_service__name')[:limit])
+
+
+def revenue_by_brand(month: date, status=None):
+    return list(month_rows(models.DailyBrandRollup, month, ('brand',), status).annotate(
+        order_count=Sum('order_count'), revenue=Sum('revenue'),
+    ).order_by('-revenue', 'brand'))
+
+
+def revenue_by_status(month: date):
+    rows = month_rows(models.DailyStatusRollup, month, ('order_status',)).annotate(
+        order_count=Sum('order_count'), line_count=Sum('line_count'), revenue=Sum('revenue'),
+    ).order_by('order_status')
+    labels = dict(models.ORDER_STATUS)
+    return [dict(row, status=labels.get(row['order_status'])) for row in rows]
+
+
+def monthly_revenue(status=None, months=12):
+    rows = models.DailyStatusRollup.objects.all()
+    if status is not None:
+        rows = rows.filter(order_status=status)
+    return list(rows.annotate(month=TruncMonth('day')).order_by().values('month').annotate(
+        order_count=Sum('order_count'), revenue=Sum('revenue'),
+    ).order_by('-month')[:months])
@@ -0,0 +1,54 @@
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from . import catalog_cache, models
+
+FEED_PAGE_SIZE = 10
+FEED_ORDERING = ('-created_at', '-pk')
+
+
+def review_feed(part_service_id: int):
+    return models.PartServiceReview.objects.filter(partservice_id=part_service_id).select_related('reviewer')
+
+
+def latest_review_date():
+    return models.PartServiceReview.objects.filter(
+        partservice=OuterRef('pk'),
+    ).order_by('-created_at').values('created_at')[:1]
+
+
+def record(review: models.PartServiceReview) -> None:
+    """Counts a new review on its part without recounting all the reviews."""
+    models.PartService.objects.filter(pk=review.partservice_id).update(
+        review_count=F('review_count') + 1,
+        last_reviewed_at=Case(
+            When(Q(last_reviewed_at__isnull=True) | Q(last_reviewed_at__lt=review.created_at),
+                 then=Value(review.created_at)),
+            default=F('last_reviewed_at'),
+        ),
+    )
+    catalog_cache.invalidate()
+
+
+def forget(review: models.PartServiceReview) -> None:
+    # the row is already gone, so the latest remaining review is the new last one
+    models.PartService.objects.filter(pk=review.partservice_id, review_count__gt=0).update(
+        review_count=F('review_count') - 1,
+        last_reviewed_at=Subquery(latest_review_date()),
+    )
+    catalog_cache.invalidate()
+
+
+def refresh(part_service_ids=None) -> int:
+    """Recounts the stored review numbers from the reviews, after bulk writes or for repairs."""
+    review_counts = models.PartServiceReview.objects.filter(
+        partservice=OuterRef('pk'),
+    ).order_by().values('partservice').annotate(count=Count('pk')).values('count')
+    part_services = models.PartService.objects.all()
+    if part_service_ids is not None:
+        part_services = part_services.filter(pk__in=part_service_ids)
+    updated = part_services.update(
+        review_count=Coalesce(Subquery(review_counts, output_field=IntegerField()), 0),
+        last_reviewed_at=Subquery(latest_review_date()),
+    )
+    catalog_cache.invalidate()
+    return updated
@@ -0,0 +1,94 @@
+"""Sends the reads of read-only pages to a replica database.
+
+Routing only happens inside views wrapped with read_only() and only when
+settings.REPLICA_DATABASE names a configured alias. Writes always go to the
+primary, and a session that wrote something reads from the primary for
+REPLICA_STICKY_SECONDS so it sees its own changes before the next sync.
+"""
+import sqlite3
+import time
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.template.response import SimpleTemplateResponse
+
+STICKY_SESSION_KEY = 'library_primary_until'
+# sessions are written on every request, they must never be read from a stale copy
+PRIMARY_ONLY_APPS = {'sessions'}
+
+_use_replica = ContextVar('library_use_replica', default=False)
+
+
+def replica_alias():
+    return getattr(settings, 'REPLICA_DATABASE', None)
+
+
+def read_database() -> str:
+    """The alias reads go to right now, for querysets evaluated after the view returns."""
+    alias = replica_alias()
+    return alias if alias and _use_replica.get() else DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return None
+        if _use_replica.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica is a copy made by sync_replica, never migrated itself
+        if db != DEFAULT_DB_ALIAS and db == replica_alias():
+            return False
+        return None
+
+
+def wrote(request) -> None:
+    """Keeps this session on the primary for a while after it changed something."""
+    request.session[STICKY_SESSION_KEY] = time.time() + getattr(settings, 'REPLICA_STICKY_SECONDS', 30)
+
+
+def is_sticky(request) -> bool:
+    return request.session.get(STICKY_SESSION_KEY, 0) > time.time()
+
+
+def read_only(view):
+    """Runs the reads of a function view on the replica, rendering included."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not replica_alias() or is_sticky(request):
+            return view(request, *args, **kwargs)
+        # the logged in user is loaded from the primary, a new account may not be synced yet
+        request.user.is_authenticated
+        token = _use_replica.set(True)
+        try:
+            response = view(request, *args, **kwargs)
+            if isinstance(response, SimpleTemplateResponse):
+                response.render()
+            return response
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+def sync_replica(source, target) -> None:
+    """Copies the primary SQLite file into the replica with the online backup API.
+
+    Readers of the replica see either the old or the new copy, never a mix.
+    """
+    with sqlite3.connect(source) as primary, sqlite3.connect(target) as replica:
+        primary.backup(replica)
+    primary.close()
+    replica.close()
@@ -0,0 +1,65 @@
+import re
+from django.db.models import Exists, OuterRef, QuerySet
+from . import models
+
+TOKEN_RE = re.compile(r'[\w-]+')
+BATCH_SIZE = 500
+
+
+def tokenize(text) -> list[str]:
+    return [token[:150] for token in TOKEN_RE.findall(str(text or '').lower())]
+
+
+def order_tokens(order: models.ServiceOrder) -> set[tuple[str, int]]:
+    tokens = {(str(order.pk), 0)}
+    tokens.update((token, 1) for token in tokenize(order.car.plate))
+    customer = order.car.customer
+    for value in (customer.username, customer.first_name, customer.last_name):
+        tokens.update((token, 2) for token in tokenize(value))
+    for line in order.lines.all():
+        tokens.update((token, 3) for token in tokenize(line.part_service.name))
+    if order.date:
+        tokens.add((order.date.isoformat(), 4))
+    return tokens
+
+
+def reindex_orders(order_ids, service_order_model=models.ServiceOrder, token_model=models.OrderSearchToken) -> int:
+    """Rebuilds search tokens of the given orders, returns number of tokens written.
+
+    Migrations pass their historical models, the current ones may have
+    columns the migrated tables do not have yet.
+    """
+    order_ids = list(order_ids)
+    written = 0
+    for start in range(0, len(order_ids), BATCH_SIZE):
+        batch = order_ids[start:start + BATCH_SIZE]
+        orders = service_order_model.objects.filter(pk__in=batch).select_related(
+            'car__customer',
+        ).prefetch_related('lines__part_service')
+        new_tokens = [
+            token_model(order=order, token=token, kind=kind)
+            for order in orders
+            for token, kind in order_tokens(order)
+        ]
+        token_model.objects.filter(order_id__in=batch).delete()
+        token_model.objects.bulk_create(new_tokens, batch_size=BATCH_SIZE)
+        written += len(new_tokens)
+    return written
+
+
+def search_orders(queryset: QuerySet, query: str) -> QuerySet:
+    """Filters orders matching every word of the query by token prefix.
+
+    Each term is a range scan on the token index, so every order is returned once
+    and exact order id or plate matches are ranked first.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return queryset
+    for term in terms:
+        # range instead of startswith, LIKE can not use the index on SQLite
+        matching = models.OrderSearchToken.objects.filter(token__gte=term, token__lt=term + '\uffff')
+        queryset = queryset.filter(pk__in=matching.values('order'))
+    exact = models.OrderSearchToken.objects.filter(order=OuterRef('pk'), kind__in=(0, 1), token__in=terms)
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+    return queryset.annotate(exact_match=Exists(exact)).order_by('-exact_match', *ordering)
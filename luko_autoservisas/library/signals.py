@@ -0,0 +1,212 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.contrib.auth import get_user_model
+from django.dispatch import receiver
+from . import brands, car_models, catalog_cache, models, orders, reports, reviews, search, stats
+
+User = get_user_model()
+USER_SEARCH_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=models.ServiceOrder)
+def index_order(sender, instance, **kwargs):
+    search.reindex_orders([instance.pk])
+
+
+@receiver(post_save, sender=models.OrderLine)
+def index_order_line(sender, instance, **kwargs):
+    search.reindex_orders([instance.order_id])
+
+
+@receiver(post_delete, sender=models.OrderLine)
+def unindex_order_line(sender, instance, **kwargs):
+    # a cascade deletes the order's tokens and lines before the order itself,
+    # tokens written now would point at an order about to go; after commit
+    # reindex_orders only writes tokens for orders that still exist
+    order_id = instance.order_id
+    transaction.on_commit(lambda: search.reindex_orders([order_id]))
+
+
+@receiver(post_save, sender=models.Car)
+def index_car_orders(sender, instance, created, **kwargs):
+    if not created:
+        search.reindex_orders(instance.orders.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=models.PartService)
+def index_part_service_orders(sender, instance, created, **kwargs):
+    if not created:
+        search.reindex_orders(
+            models.ServiceOrder.objects.filter(lines__part_service=instance).values_list('pk', flat=True).distinct()
+        )
+
+
+@receiver(post_save, sender=User)
+def index_customer_orders(sender, instance, created, update_fields=None, **kwargs):
+    # last_login is saved on every login, only names are searchable
+    if created or (update_fields and not USER_SEARCH_FIELDS.intersection(update_fields)):
+        return
+    search.reindex_orders(
+        models.ServiceOrder.objects.filter(car__customer=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver(pre_save, sender=models.CarModel)
+def remember_car_model_brand(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance._previous_brand = sender.objects.filter(pk=instance.pk).values_list('brand', flat=True).first()
+
+
+@receiver(post_save, sender=models.CarModel)
+def count_car_model(sender, instance, created, **kwargs):
+    if created:
+        if not stats.bump(stats.CAR_MODELS, 1):
+            stats.bump_brand(instance.brand, 1)
+    elif getattr(instance, '_previous_brand', instance.brand) != instance.brand:
+        stats.bump_brand(instance._previous_brand, -1)
+        stats.bump_brand(instance.brand, 1)
+
+
+@receiver(post_delete, sender=models.CarModel)
+def uncount_car_model(sender, instance, **kwargs):
+    if not stats.bump(stats.CAR_MODELS, -1):
+        stats.bump_brand(instance.brand, -1)
+
+
+@receiver(post_save, sender=models.CarModel)
+@receiver(post_delete, sender=models.CarModel)
+def reload_car_models(sender, instance, **kwargs):
+    car_models.invalidate()
+
+
+@receiver(post_save, sender=models.CarModel)
+@receiver(post_delete, sender=models.CarModel)
+@receiver(post_save, sender=models.Car)
+@receiver(post_delete, sender=models.Car)
+@receiver(post_delete, sender=models.ServiceOrder)
+def recount_brands(sender, instance, **kwargs):
+    brands.invalidate()
+
+
+@receiver(post_save, sender=models.ServiceOrder)
+def recount_order_brands(sender, instance, created, **kwargs):
+    # a status change leaves the order counts as they are
+    if created or getattr(instance, '_previous_car_id', instance.car_id) != instance.car_id:
+        brands.invalidate()
+
+
+@receiver(post_save, sender=models.PartService)
+def count_part_service(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(stats.PARTS, 1)
+
+
+@receiver(post_delete, sender=models.PartService)
+def uncount_part_service(sender, instance, **kwargs):
+    stats.bump(stats.PARTS, -1)
+
+
+@receiver(post_save, sender=models.PartService)
+@receiver(post_delete, sender=models.PartService)
+def invalidate_catalog(sender, instance, **kwargs):
+    catalog_cache.invalidate()
+
+
+@receiver(pre_save, sender=models.ServiceOrder)
+def remember_order_status(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance._previous_status, instance._previous_date, instance._previous_car_id = sender.objects.filter(
+            pk=instance.pk,
+        ).values_list('order_status', 'date', 'car_id').first() or (None, None, None)
+
+
+@receiver(post_save, sender=models.ServiceOrder)
+def count_order(sender, instance, created, **kwargs):
+    completed = instance.order_status == stats.COMPLETED_STATUS
+    if created:
+        if not stats.bump(stats.ORDERS, 1):
+            stats.bump(stats.COMPLETED_ORDERS, int(completed))
+    else:
+        was_completed = getattr(instance, '_previous_status', None) == stats.COMPLETED_STATUS
+        stats.bump(stats.COMPLETED_ORDERS, int(completed) - int(was_completed))
+
+
+@receiver(post_delete, sender=models.ServiceOrder)
+def uncount_order(sender, instance, **kwargs):
+    if not stats.bump(stats.ORDERS, -1):
+        stats.bump(stats.COMPLETED_ORDERS, -int(instance.order_status == stats.COMPLETED_STATUS))
+
+
+@receiver(pre_save, sender=models.PartServiceReview)
+def remember_review_part(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance._previous_partservice_id = sender.objects.filter(
+            pk=instance.pk,
+        ).values_list('partservice_id', flat=True).first()
+
+
+@receiver(post_save, sender=models.PartServiceReview)
+def count_review(sender, instance, created, **kwargs):
+    if created:
+        reviews.record(instance)
+        return
+    previous = getattr(instance, '_previous_partservice_id', instance.partservice_id)
+    if previous != instance.partservice_id:
+        reviews.refresh([previous, instance.partservice_id])
+
+
+@receiver(post_delete, sender=models.PartServiceReview)
+def uncount_review(sender, instance, **kwargs):
+    reviews.forget(instance)
+
+
+@receiver(pre_save, sender=models.OrderLine)
+def remember_order_line(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance._previous_line = sender.objects.filter(pk=instance.pk).values_list('order_id', 'price').first()
+
+
+@receiver(post_save, sender=models.OrderLine)
+def total_order_line(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, '_previous_line', None)
+    if previous is None:
+        orders.change_totals(instance.order_id, instance.price, 1)
+    elif previous[0] != instance.order_id:
+        orders.change_totals(previous[0], -previous[1], -1)
+        orders.change_totals(instance.order_id, instance.price, 1)
+    else:
+        orders.change_totals(instance.order_id, instance.price - previous[1], 0)
+
+
+@receiver(post_delete, sender=models.OrderLine)
+def untotal_order_line(sender, instance, **kwargs):
+    orders.change_totals(instance.order_id, -instance.price, -1)
+
+
+@receiver(post_save, sender=models.ServiceOrder)
+@receiver(post_delete, sender=models.ServiceOrder)
+def mark_order_report_days(sender, instance, **kwargs):
+    # date is auto_now, a saved order moves from its old day to today
+    reports.mark_days({instance.date, getattr(instance, '_previous_date', None)})
+
+
+@receiver(post_save, sender=models.OrderLine)
+@receiver(post_delete, sender=models.OrderLine)
+def mark_order_line_report_days(sender, instance, **kwargs):
+    order_ids = {instance.order_id}
+    previous = getattr(instance, '_previous_line', None)
+    if previous:
+        order_ids.add(previous[0])
+    reports.mark_order_days(models.ServiceOrder.objects.filter(pk__in=order_ids))
+
+
+@receiver(post_save, sender=models.Car)
+def mark_car_report_days(sender, instance, created, **kwargs):
+    if not created:
+        reports.mark_order_days(instance.orders.all())
+
+
+@receiver(post_save, sender=models.CarModel)
+def mark_car_model_report_days(sender, instance, created, **kwargs):
+    if getattr(instance, '_previous_brand', instance.brand) != instance.brand:
+        reports.mark_order_days(models.ServiceOrder.objects.filter(car__car_model=instance))
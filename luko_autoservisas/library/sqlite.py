@@ -0,0 +1,158 @@
+"""SQLite connection setup: pragmas on connect and immediate write transactions.
+
+Every new SQLite connection gets settings.SQLITE_PRAGMAS, or the PRAGMAS of
+its DATABASES entry. WAL lets readers carry on while an order is written and
+busy_timeout makes writers queue instead of failing with "database is locked".
+
+Transactions opened by immediate_atomic() take the write lock at BEGIN. A
+plain deferred transaction that reads before it writes has to upgrade its
+lock later, and SQLite fails such an upgrade at once when another writer got
+in first, whatever the busy timeout.
+
+Django 4.2 has no setting for the BEGIN it issues, so the connections get
+their own _start_transaction_under_autocommit. That method is private and
+only checked against Django 4.2 (requirements.txt pins 4.2.5); importing this
+module under another version fails instead of silently going back to
+deferred transactions. Django 5.1 can do this with OPTIONS['transaction_mode'].
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+import django
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.utils import load_backend
+from django.db.backends.signals import connection_created
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.dispatch import receiver
+
+# the Django version the private transaction hook below was checked against
+PATCHED_DJANGO = (4, 2)
+if django.VERSION[:2] != PATCHED_DJANGO or not hasattr(DatabaseWrapper, '_start_transaction_under_autocommit'):
+    raise ImproperlyConfigured(
+        f"library.sqlite replaces DatabaseWrapper._start_transaction_under_autocommit of Django "
+        f"{'.'.join(map(str, PATCHED_DJANGO))}, check it against Django {django.get_version()} first"
+    )
+
+# pragmas that can be set from settings, with the values they accept
+PRAGMAS = {
+    'journal_mode': {'delete', 'truncate', 'persist', 'memory', 'wal', 'off'},
+    'synchronous': {'off', 'normal', 'full', 'extra'},
+    'mmap_size': int,
+    'cache_size': int,
+    'busy_timeout': int,
+    'temp_store': {'default', 'file', 'memory'},
+}
+
+
+def pragma_statements(pragmas):
+    for name, value in pragmas.items():
+        allowed = PRAGMAS.get(name)
+        if allowed is None:
+            raise ValueError(f"unsupported SQLite pragma {name!r}")
+        if allowed is int:
+            value = int(value)
+        elif str(value).lower() not in allowed:
+            raise ValueError(f"invalid value {value!r} for SQLite pragma {name!r}")
+        yield f"PRAGMA {name} = {value}"
+
+
+def start_transaction(connection):
+    immediate = getattr(connection, 'immediate_transactions', False)
+    connection.cursor().execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS', getattr(settings, 'SQLITE_PRAGMAS', {}))
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(pragmas):
+            cursor.execute(statement)
+    # Django 4.2 always opens SQLite transactions with a plain BEGIN, see PATCHED_DJANGO
+    connection._start_transaction_under_autocommit = partial(start_transaction, connection)
+
+
+@contextmanager
+def immediate_atomic(using=None):
+    """transaction.atomic() that takes the SQLite write lock when it begins.
+
+    Inside an already open transaction it is a plain savepoint, the lock mode
+    of the outer transaction can not be changed any more.
+    """
+    connection = transaction.get_connection(using)
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+    connection.immediate_transactions = True
+    try:
+        with transaction.atomic(using=using):
+            connection.immediate_transactions = False
+            yield
+    finally:
+        connection.immediate_transactions = False
+
+
+def stress(path, workers=8, transactions=25, configured=True):
+    """Places orders from several threads at once into a scratch SQLite file.
+
+    Each transaction reads the latest order number and then writes an order
+    with three lines, the pattern of the order and review write paths. With
+    configured=False the connections use the Django defaults and deferred
+    transactions. Returns the committed and failed transaction counts.
+    """
+    database = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(path)}
+    if not configured:
+        database['PRAGMAS'] = {}
+    settings_dict = connections.configure_settings({DEFAULT_DB_ALIAS: database})[DEFAULT_DB_ALIAS]
+    backend = load_backend(settings_dict['ENGINE']).DatabaseWrapper
+    setup = backend(dict(settings_dict), alias='stress')
+    with setup.cursor() as cursor:
+        cursor.execute('CREATE TABLE IF NOT EXISTS stress_order (id INTEGER PRIMARY KEY, number INTEGER, worker INTEGER)')
+        cursor.execute('CREATE TABLE IF NOT EXISTS stress_line (id INTEGER PRIMARY KEY, order_id INTEGER, price REAL)')
+    setup.close()
+    results = {'committed': 0, 'locked': 0}
+    lock = threading.Lock()
+    begin = threading.Barrier(workers)
+
+    def place_orders(worker):
+        alias = f'stress_{worker}'
+        connections[alias] = backend(dict(settings_dict), alias=alias)
+        atomic = partial(immediate_atomic if configured else transaction.atomic, using=alias)
+        begin.wait()
+        try:
+            for number in range(transactions):
+                try:
+                    with atomic(), connections[alias].cursor() as cursor:
+                        cursor.execute('SELECT COALESCE(MAX(number), 0) FROM stress_order')
+                        next_number = cursor.fetchone()[0] + 1
+                        # the time a view spends between reading and writing
+                        time.sleep(0.001)
+                        cursor.execute(
+                            'INSERT INTO stress_order (number, worker) VALUES (%s, %s)', [next_number, worker],
+                        )
+                        order_id = cursor.lastrowid
+                        for line in range(3):
+                            cursor.execute('INSERT INTO stress_line (order_id, price) VALUES (%s, %s)', [order_id, 10])
+                except OperationalError as error:
+                    if 'locked' not in str(error):
+                        raise
+                    outcome = 'locked'
+                else:
+                    outcome = 'committed'
+                with lock:
+                    results[outcome] += 1
+        finally:
+            connections[alias].close()
+            del connections[alias]
+
+    threads = [threading.Thread(target=place_orders, args=(worker,)) for worker in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
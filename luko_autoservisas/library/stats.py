@@ -0,0 +1,91 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from . import models
+
+CACHE_KEY = 'library:dashboard_stats'
+CAR_MODELS = 'car_models'
+PARTS = 'parts'
+ORDERS = 'orders'
+COMPLETED_ORDERS = 'completed_orders'
+COMPLETED_STATUS = 4
+
+
+def count_all() -> dict[str, int]:
+    return {
+        CAR_MODELS: models.CarModel.objects.count(),
+        PARTS: models.PartService.objects.count(),
+        ORDERS: models.ServiceOrder.objects.count(),
+        COMPLETED_ORDERS: models.ServiceOrder.objects.filter(order_status=COMPLETED_STATUS).count(),
+    }
+
+
+def invalidate() -> None:
+    cache.delete(CACHE_KEY)
+    # a request running before commit could cache the old values again
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
+
+
+@transaction.atomic
+def rebuild() -> dict:
+    """Recounts everything from the source tables, for the initial fill and repairs."""
+    counters = count_all()
+    models.DashboardCounter.objects.all().delete()
+    models.DashboardCounter.objects.bulk_create(
+        models.DashboardCounter(name=name, value=value) for name, value in counters.items()
+    )
+    models.BrandSummary.objects.all().delete()
+    models.BrandSummary.objects.bulk_create(
+        models.BrandSummary(brand=row['brand'], model_count=row['model_count'])
+        for row in models.CarModel.objects.order_by().values('brand').annotate(model_count=Count('pk'))
+    )
+    invalidate()
+    return counters
+
+
+def bump(name: str, delta: int) -> bool:
+    """Adds delta to a counter, returns True when everything was recounted instead.
+
+    A recount already includes the change being counted, so the caller must
+    skip its other bumps for the same change.
+    """
+    if not delta:
+        return False
+    updated = models.DashboardCounter.objects.filter(name=name).update(value=F('value') + delta)
+    if not updated:
+        # the summary was never filled
+        rebuild()
+        return True
+    invalidate()
+    return False
+
+
+def bump_brand(brand: str, delta: int) -> None:
+    if delta > 0:
+        models.BrandSummary.objects.get_or_create(brand=brand)
+    summaries = models.BrandSummary.objects.filter(brand=brand)
+    summaries.filter(model_count__gte=-delta).update(model_count=F('model_count') + delta)
+    summaries.filter(model_count=0).delete()
+    invalidate()
+
+
+def get_dashboard() -> dict:
+    stats = cache.get(CACHE_KEY)
+    if stats is None:
+        counters = dict(models.DashboardCounter.objects.values_list('name', 'value'))
+        if not counters:
+            counters = rebuild()
+        stats = {
+            'counters': counters,
+            'brands': list(models.BrandSummary.objects.values_list('brand', flat=True)),
+        }
+        cache.set(CACHE_KEY, stats, None)
+    return stats
+
+
+async def aget_dashboard() -> dict:
+    stats = await cache.aget(CACHE_KEY)
+    if stats is None:
+        stats = await sync_to_async(get_dashboard)()
+    return stats
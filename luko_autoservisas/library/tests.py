@@ -1,3 +1,1297 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.sessions.models import Session
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from . import benchmark, brands, car_models, catalog_cache, covers, models, orders, pagination, query_plans, reports, reviews, routers, search, sqlite, stats, views, visits
 
-# Create your tests here.
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+# the default cache is shared with the running workers, the tests get their own
+test_caches = override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+
+
+def setUpModule():
+    test_caches.enable()
+
+
+def tearDownModule():
+    test_caches.disable()
+
+
+class ServiceListViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='jonas', password='slaptazodis')
+        car_model = models.CarModel.objects.create(brand='Audi', model='A4', year=2010)
+        cls.car = models.Car.objects.create(
+            customer=cls.customer, car_model=car_model, plate='ABC123', vin='VIN', color='black',
+        )
+        cls.oil = models.PartService.objects.create(name='Oil change', price=Decimal('40.00'))
+        cls.filter = models.PartService.objects.create(name='Air filter', price=Decimal('15.50'))
+
+    def create_orders(self, count):
+        for _ in range(count):
+            order = models.ServiceOrder.objects.create(car=self.car)
+            models.OrderLine.objects.create(order=order, part_service=self.oil, quantity=1, price=Decimal('40.00'))
+            models.OrderLine.objects.create(order=order, part_service=self.filter, quantity=2, price=Decimal('31.00'))
+
+    def test_lists_every_line_and_total(self):
+        self.create_orders(1)
+        response = self.client.get(reverse('serviceorder_list'))
+        self.assertContains(response, 'Oil change')
+        self.assertContains(response, 'Air filter')
+        self.assertEqual(response.context['service_orders'][0].total_amount, Decimal('71.00'))
+
+    def test_order_without_lines_has_zero_total(self):
+        models.ServiceOrder.objects.create(car=self.car)
+        response = self.client.get(reverse('serviceorder_list'))
+        self.assertEqual(response.context['service_orders'][0].total_amount, 0)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.create_orders(1)
+        # orders with car and customer, lines with parts
+        with self.assertNumQueries(2):
+            self.client.get(reverse('serviceorder_list'))
+        self.create_orders(7)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('serviceorder_list'))
+
+
+class OrderSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='jonas', password='slaptazodis')
+        car_model = models.CarModel.objects.create(brand='Audi', model='A4', year=2010)
+        cls.car = models.Car.objects.create(
+            customer=cls.customer, car_model=car_model, plate='ABC123', vin='VIN', color='black',
+        )
+        cls.oil = models.PartService.objects.create(name='Oil change', price=Decimal('40.00'))
+        cls.order = models.ServiceOrder.objects.create(car=cls.car)
+        models.OrderLine.objects.create(order=cls.order, part_service=cls.oil, quantity=1, price=Decimal('40.00'))
+        models.OrderLine.objects.create(order=cls.order, part_service=cls.oil, quantity=1, price=Decimal('40.00'))
+
+    def search(self, query):
+        return list(search.search_orders(models.ServiceOrder.objects.all(), query))
+
+    def test_matches_part_customer_and_plate_once(self):
+        self.assertEqual(self.search('oil'), [self.order])
+        self.assertEqual(self.search('jon'), [self.order])
+        self.assertEqual(self.search('abc123'), [self.order])
+        self.assertEqual(self.search('oil jonas'), [self.order])
+        self.assertEqual(self.search('brakes'), [])
+
+    def test_exact_plate_match_ranked_first(self):
+        other_car = models.Car.objects.create(
+            customer=self.customer, car_model=self.car.car_model, plate='ABC12', vin='VIN2', color='red',
+        )
+        other_order = models.ServiceOrder.objects.create(car=other_car)
+        self.assertEqual(self.search('abc12'), [other_order, self.order])
+
+    def test_index_follows_renames(self):
+        self.oil.name = 'Engine oil'
+        self.oil.save()
+        self.assertEqual(self.search('engine'), [self.order])
+        self.customer.username = 'petras'
+        self.customer.save()
+        self.assertEqual(self.search('petras'), [self.order])
+        self.assertEqual(self.search('jonas'), [])
+
+    def test_removed_line_is_not_searchable(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.lines.all().delete()
+        self.assertEqual(self.search('oil'), [])
+
+    def test_order_with_lines_can_be_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.delete()
+        self.assertFalse(models.OrderSearchToken.objects.exists())
+        # deferred foreign keys are only checked at commit
+        connection.check_constraints()
+
+    def test_car_with_orders_can_be_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.car.delete()
+        self.assertFalse(models.ServiceOrder.objects.exists())
+        self.assertFalse(models.OrderSearchToken.objects.exists())
+        connection.check_constraints()
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(username='jonas', password='slaptazodis')
+        self.audi = models.CarModel.objects.create(brand='Audi', model='A4', year=2010)
+        models.CarModel.objects.create(brand='Audi', model='A6', year=2012)
+        self.car = models.Car.objects.create(
+            customer=self.customer, car_model=self.audi, plate='ABC123', vin='VIN', color='black',
+        )
+        models.PartService.objects.create(name='Oil change', price=Decimal('40.00'))
+
+    def test_counters_follow_changes(self):
+        order = models.ServiceOrder.objects.create(car=self.car)
+        models.ServiceOrder.objects.create(car=self.car, order_status=4)
+        order.order_status = 4
+        order.save()
+        self.assertEqual(stats.get_dashboard()['counters'], {
+            stats.CAR_MODELS: 2, stats.PARTS: 1, stats.ORDERS: 2, stats.COMPLETED_ORDERS: 2,
+        })
+        order.delete()
+        self.assertEqual(stats.get_dashboard()['counters'][stats.COMPLETED_ORDERS], 1)
+        self.assertEqual(stats.get_dashboard()['counters'], stats.count_all())
+
+    def test_brand_list_follows_car_models(self):
+        bmw = models.CarModel.objects.create(brand='BMW', model='X5', year=2015)
+        self.assertEqual(stats.get_dashboard()['brands'], ['Audi', 'BMW'])
+        bmw.brand = 'Volvo'
+        bmw.save()
+        self.assertEqual(stats.get_dashboard()['brands'], ['Audi', 'Volvo'])
+        bmw.delete()
+        self.assertEqual(stats.get_dashboard()['brands'], ['Audi'])
+
+    def test_rebuild_repairs_drift(self):
+        models.DashboardCounter.objects.filter(name=stats.PARTS).update(value=100)
+        models.BrandSummary.objects.all().delete()
+        stats.rebuild()
+        self.assertEqual(stats.get_dashboard()['counters'][stats.PARTS], 1)
+        self.assertEqual(stats.get_dashboard()['brands'], ['Audi'])
+
+    def test_missing_counters_are_not_counted_twice(self):
+        models.DashboardCounter.objects.all().delete()
+        models.ServiceOrder.objects.create(car=self.car, order_status=4)
+        self.assertEqual(stats.get_dashboard()['counters'], stats.count_all())
+        models.DashboardCounter.objects.all().delete()
+        models.BrandSummary.objects.all().delete()
+        models.CarModel.objects.create(brand='BMW', model='X5', year=2015)
+        self.assertEqual(stats.get_dashboard()['counters'][stats.CAR_MODELS], 3)
+        self.assertEqual(
+            dict(models.BrandSummary.objects.values_list('brand', 'model_count')), {'Audi': 2, 'BMW': 1},
+        )
+
+    def test_cached_dashboard_needs_no_queries(self):
+        stats.get_dashboard()
+        with self.assertNumQueries(0):
+            stats.get_dashboard()
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Car Models: 2')
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        models.PartService.objects.bulk_create(
+            models.PartService(name=f'Part {number:02}', price=Decimal('1.00')) for number in range(20)
+        )
+        models.PartService.objects.create(name='Part 05', price=Decimal('2.00'))
+
+    def names(self, page):
+        return [part.name for part in page]
+
+    def test_walks_forward_and_back(self):
+        paginator = pagination.CursorPaginator(models.PartService.objects.all(), 8, ordering=('name', 'pk'))
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        third = paginator.page(second.next_cursor)
+        self.assertEqual(self.names(first)[-3:], ['Part 05', 'Part 05', 'Part 06'])
+        self.assertEqual(self.names(second)[0], 'Part 07')
+        self.assertEqual(len(third), 5)
+        self.assertFalse(third.has_next())
+        self.assertEqual(self.names(paginator.page(third.previous_cursor)), self.names(second))
+        self.assertEqual(self.names(paginator.page(second.previous_cursor)), self.names(first))
+        self.assertFalse(paginator.page(second.previous_cursor).has_previous())
+        last = paginator.page(pagination.LAST)
+        self.assertEqual(self.names(last)[0], 'Part 12')
+        self.assertEqual(self.names(last)[-5:], self.names(third))
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        paginator = pagination.CursorPaginator(models.PartService.objects.all(), 8, ordering=('name', 'pk'))
+        self.assertEqual(self.names(paginator.get_page('garbage')), self.names(paginator.page()))
+
+    def test_count_can_be_skipped(self):
+        paginator = pagination.CursorPaginator(models.PartService.objects.all(), 8, count_total=False)
+        with self.assertNumQueries(1):
+            paginator.page()
+            self.assertIsNone(paginator.count)
+
+    def test_parts_view_follows_cursor(self):
+        response = self.client.get(reverse('part_list'))
+        next_cursor = response.context['part_list'].next_cursor
+        self.assertContains(response, f'cursor={next_cursor}')
+        response = self.client.get(reverse('part_list'), {'cursor': next_cursor})
+        self.assertEqual(response.context['part_list'][0].name, 'Part 07')
+
+
+class CustomerListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        car_model = models.CarModel.objects.create(brand='Audi', model='A4', year=2010)
+        cls.jonas = User.objects.create_user(username='jonas', password='slaptazodis')
+        cls.petras = User.objects.create_user(username='petras', password='slaptazodis')
+        User.objects.create_user(username='be_masinos', password='slaptazodis')
+        for plate in ('AAA111', 'BBB222', 'CCC333'):
+            car = models.Car.objects.create(
+                customer=cls.jonas, car_model=car_model, plate=plate, vin='VIN', color='black',
+            )
+            models.ServiceOrder.objects.create(car=car)
+        models.Car.objects.create(customer=cls.petras, car_model=car_model, plate='DDD444', vin='VIN', color='red')
+        cls.staff = User.objects.create_user(username='admin', password='slaptazodis', is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_only_staff_see_customers(self):
+        self.client.force_login(self.jonas)
+        self.assertEqual(self.client.get(reverse('customer_list')).status_code, 302)
+
+    def test_lists_each_customer_once_with_totals(self):
+        response = self.client.get(reverse('customer_list'))
+        customers = list(response.context['customers'])
+        self.assertEqual(customers, [self.jonas, self.petras])
+        self.assertEqual(customers[0].summary['car_count'], 3)
+        self.assertEqual(customers[0].summary['order_count'], 3)
+        self.assertIsNotNone(customers[0].summary['last_order_date'])
+        self.assertEqual(customers[1].summary['order_count'], 0)
+
+    def test_filters_by_name_prefix(self):
+        response = self.client.get(reverse('customer_list'), {'query': 'pet'})
+        self.assertEqual(list(response.context['customers']), [self.petras])
+
+    def test_query_count_does_not_grow_with_customers(self):
+        # staff user, customer page, grouped car and order totals
+        with self.assertNumQueries(3):
+            self.client.get(reverse('customer_list'))
+
+
+class PlaceOrderViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='jonas', password='slaptazodis')
+        car_model = models.CarModel.objects.create(brand='Audi', model='A4', year=2010)
+        cls.car = models.Car.objects.create(
+            customer=cls.customer, car_model=car_model, plate='ABC123', vin='VIN', color='black',
+        )
+        cls.parts = models.PartService.objects.bulk_create(
+            models.PartService(name=f'Part {number}', price=Decimal('10.00') + number) for number in range(12)
+        )
+
+    def post_lines(self, lines):
+        data = {
+            'form-TOTAL_FORMS': str(len(lines)),
+            'form-INITIAL_FORMS': '0',
+            'form-MIN_NUM_FORMS': '0',
+            'form-MAX_NUM_FORMS': '50',
+        }
+        for number, (part_id, quantity) in enumerate(lines):
+            data[f'form-{number}-part_service'] = part_id
+            data[f'form-{number}-quantity'] = quantity
+        return self.client.post(reverse('place_order', kwargs={'car_id': self.car.pk}), data)
+
+    def test_places_one_order_with_all_lines(self):
+        response = self.post_lines([(part.pk, 2) for part in self.parts] + [('', '')])
+        self.assertRedirects(response, reverse('user_car_list'), fetch_redirect_response=False)
+        order = models.ServiceOrder.objects.get()
+        self.assertEqual(order.lines.count(), 12)
+        self.assertEqual(order.lines.get(part_service=self.parts[3]).price, Decimal('26.00'))
+        self.assertEqual(list(search.search_orders(models.ServiceOrder.objects.all(), 'part')), [order])
+
+    def test_query_count_does_not_grow_with_lines(self):
+        # the first request puts the session into the cache
+        self.post_lines([(self.parts[0].pk, 1)])
+        with CaptureQueriesContext(connection) as few_lines:
+            self.post_lines([(part.pk, 1) for part in self.parts[:2]])
+        with self.assertNumQueries(len(few_lines)):
+            self.post_lines([(part.pk, 1) for part in self.parts])
+
+    def test_catalog_is_not_loaded_for_the_form(self):
+        self.client.force_login(self.customer)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('place_order', kwargs={'car_id': self.car.pk}))
+        self.assertNotContains(response, '<option')
+        self.assertFalse([query for query in queries if 'library_partservice' in query['sql']])
+        with CaptureQueriesContext(connection) as queries:
+            self.post_lines([(part.pk, 1) for part in self.parts[:3]])
+        # the in_bulk price check and the search tokens read the submitted parts only
+        part_reads = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and 'FROM "library_partservice"' in query['sql']
+        ]
+        self.assertTrue(part_reads)
+        for sql in part_reads:
+            self.assertIn('"library_partservice"."id" IN', sql)
+
+    def test_part_autocomplete(self):
+        results = self.client.get(reverse('part_autocomplete'), {'q': 'part 1'}).json()['results']
+        self.assertEqual([part['name'] for part in results], ['Part 1', 'Part 10', 'Part 11'])
+        self.assertEqual(results[0], {'id': self.parts[1].pk, 'name': 'Part 1', 'price': '11.00'})
+        self.assertEqual(self.client.get(reverse('part_autocomplete')).json()['results'], [])
+
+    def test_rejects_unknown_part_and_empty_order(self):
+        response = self.post_lines([(self.parts[0].pk, 1), (999999, 1)])
+        self.assertEqual(response.status_code, 200)
+        response = self.post_lines([('', '')])
+        self.assertContains(response, 'Add at least one part or service.')
+        self.assertFalse(models.ServiceOrder.objects.exists())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CoverDerivativeTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def make_cover(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (2000, 1000), 'blue').save(buffer, 'PNG')
+        return SimpleUploadedFile('cover.png', buffer.getvalue(), content_type='image/png')
+
+    def test_upload_builds_every_size_and_format(self):
+        part = models.PartService.objects.create(name='Brakes', price=Decimal('90.00'), cover=self.make_cover())
+        self.assertTrue(part.cover_hash)
+        for size, max_side in covers.COVER_SIZES.items():
+            for extension in covers.COVER_FORMATS:
+                path = os.path.join(MEDIA_ROOT, covers.derivative_name(part.cover_hash, size, extension))
+                with Image.open(path) as derivative:
+                    self.assertEqual(derivative.width, max_side)
+        response = self.client.get(reverse('part_list'))
+        self.assertContains(response, 'image/webp')
+        self.assertContains(response, part.cover_card_url)
+
+    def test_backfill_command(self):
+        part = models.PartService.objects.create(name='Brakes', price=Decimal('90.00'), cover=self.make_cover())
+        cover_hash = part.cover_hash
+        models.PartService.objects.filter(pk=part.pk).update(cover_hash='')
+        call_command('build_cover_derivatives', stdout=io.StringIO())
+        part.refresh_from_db()
+        self.assertEqual(part.cover_hash, cover_hash)
+
+    def test_backfill_refreshes_cached_catalog_pages(self):
+        cache.clear()
+        part = models.PartService.objects.create(name='Brakes', price=Decimal('90.00'), cover=self.make_cover())
+        models.PartService.objects.filter(pk=part.pk).update(cover_hash='')
+        cache.clear()
+        self.assertNotContains(self.client.get(reverse('part_list')), 'image/webp')
+        call_command('build_cover_derivatives', stdout=io.StringIO())
+        part.refresh_from_db()
+        self.assertContains(self.client.get(reverse('part_list')), part.cover_card_url)
+
+
+class ImportCatalogTests(TestCase):
+    def write(self, suffix, content):
+        catalog_file = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8')
+        catalog_file.write(content)
+        catalog_file.close()
+        self.addCleanup(os.remove, catalog_file.name)
+        return catalog_file.name
+
+    def test_upserts_parts_from_csv(self):
+        models.PartService.objects.create(name='Oil change', price=Decimal('40.00'))
+        path = self.write('.csv', 'name,price,description\nOil change,45.5,Synthetic\nAir filter,15,\nBroken,abc,\n')
+        call_command('import_catalog', 'parts', path, batch_size=2, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(models.PartService.objects.get(name='Oil change').price, Decimal('45.50'))
+        self.assertEqual(models.PartService.objects.get(name='Air filter').price, Decimal('15.00'))
+        self.assertEqual(models.PartService.objects.count(), 2)
+        self.assertEqual(stats.get_dashboard()['counters'][stats.PARTS], 2)
+
+    def test_upserts_car_models_from_jsonl(self):
+        models.CarModel.objects.create(brand='Audi', model='A4', year=2010)
+        path = self.write('.jsonl', '\n'.join(json.dumps(row) for row in [
+            {'brand': 'Audi', 'model': 'A4', 'year': 2010},
+            {'brand': 'Audi', 'model': 'A4', 'year': 2011},
+            {'brand': 'BMW', 'model': 'X5', 'year': '2015'},
+        ]))
+        output = io.StringIO()
+        call_command('import_catalog', 'car_models', path, stdout=output)
+        self.assertEqual(models.CarModel.objects.count(), 3)
+        self.assertIn('created 2', output.getvalue())
+
+    def test_shared_part_names_are_reported_not_updated(self):
+        for price in ('40.00', '42.00'):
+            models.PartService.objects.create(name='Oil change', price=Decimal(price))
+        path = self.write('.csv', 'name,price\nOil change,45\n')
+        output, errors = io.StringIO(), io.StringIO()
+        call_command('import_catalog', 'parts', path, stdout=output, stderr=errors)
+        self.assertEqual(
+            sorted(models.PartService.objects.values_list('price', flat=True)), [Decimal('40.00'), Decimal('42.00')],
+        )
+        self.assertIn('ambiguous 1', output.getvalue())
+        self.assertIn("Oil change", errors.getvalue())
+
+    def test_dry_run_writes_nothing(self):
+        path = self.write('.csv', 'name,price\nOil change,40\n')
+        output = io.StringIO()
+        call_command('import_catalog', 'parts', path, dry_run=True, stdout=output)
+        self.assertFalse(models.PartService.objects.exists())
+        self.assertIn('created 1', output.getvalue())
+
+
+class ExportOrdersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='buhaltere', password='slaptazodis', is_staff=True)
+        customer = User.objects.create_user(username='jonas', password='slaptazodis')
+        car_model = models.CarModel.objects.create(brand='Audi', model='A4', year=2010)
+        car = models.Car.objects.create(customer=customer, car_model=car_model, plate='ABC123', vin='VIN', color='black')
+        oil = models.PartService.objects.create(name='Oil change', price=Decimal('40.00'))
+        cls.order = orders.place_order(car, [(oil, 1), (oil, 2)])
+        models.ServiceOrder.objects.create(car=car, order_status=4)
+
+    def test_streams_csv_line_rows(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('export_orders'), {'status': 0})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['order_id', 'order_date', 'order_status'])
+        self.assertEqual(len(lines), 3)
+        self.assertIn('Oil change', lines[2])
+
+    def test_streams_json_with_orders_without_lines(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('export_orders'), {'format': 'json', 'status': 4})
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 1)
+        self.assertIsNone(rows[0]['line_id'])
+
+    def test_requires_staff(self):
+        response = self.client.get(reverse('export_orders'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_command_writes_csv(self):
+        output = io.StringIO()
+        call_command('export_orders', date_from='2000-01-01', stdout=output)
+        self.assertEqual(len(output.getvalue().splitlines()), 4)
+
+
+class SeedAndBenchmarkTests(TestCase):
+    def test_seeded_data_is_benchmarked_per_route(self):
+        call_command(
+            'seed_data', users=20, car_models=10, parts=30, orders=100, reviews=20, stdout=io.StringIO(),
+        )
+        self.assertEqual(models.ServiceOrder.objects.count(), 100)
+        self.assertTrue(models.OrderLine.objects.exists())
+        self.assertEqual(stats.get_dashboard()['counters'][stats.ORDERS], 100)
+        user = models.Car.objects.filter(orders__isnull=False).order_by('pk').first().customer
+        results = benchmark.run(user, iterations=2)
+        self.assertIn('car_service_orders', results)
+        self.assertIn('profile_update', results)
+        self.assertEqual(results['index']['status'], ['200'])
+        slower = {name: dict(result, p50_ms=result['p50_ms'] * 2 + 1) for name, result in results.items()}
+        self.assertEqual(benchmark.compare(results, results), [])
+        self.assertTrue(benchmark.compare(results, slower))
+
+
+@override_settings(REQUEST_TIMING=True)
+class RequestTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='jonas', password='slaptazodis')
+        car_model = models.CarModel.objects.create(brand='Audi', model='A4', year=2010)
+        cls.car = models.Car.objects.create(customer=cls.customer, car_model=car_model, plate='ABC123', vin='VIN', color='black')
+
+    def test_adds_server_timing_and_logs_request(self):
+        self.client.force_login(User.objects.create_user(username='admin', password='slaptazodis', is_staff=True))
+        with self.assertLogs('library.timing', 'INFO') as logs:
+            response = self.client.get(reverse('customer_detail', kwargs={'pk': self.customer.pk}))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['route'], 'customer_detail')
+        self.assertGreater(entry['queries'], 0)
+        self.assertGreater(entry['template_ms'], 0)
+
+    def test_report_lists_slowest_routes(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.log', delete=False, encoding='utf-8') as log_file:
+            for route, duration in (('index', 5), ('part_list', 50), ('part_list', 70)):
+                log_file.write(json.dumps({
+                    'route': route, 'path': '/', 'duration_ms': duration, 'queries': 3,
+                    'duplicate_queries': 1, 'sql_ms': 1, 'template_ms': 2,
+                }) + '\n')
+        self.addCleanup(os.remove, log_file.name)
+        output = io.StringIO()
+        call_command('timing_report', log=log_file.name, stdout=output)
+        self.assertEqual(output.getvalue().splitlines()[1].split()[0], 'part_list')
+
+
+class PartCatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.parts = [
+            models.PartService.objects.create(name=f'Part {number:02}', price=Decimal('10.00'))
+            for number in range(10)
+        ]
+
+    def test_warm_catalog_page_runs_no_queries(self):
+        self.client.get(reverse('part_list'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('part_list'))
+        self.assertContains(response, 'Part 00')
+
+    def test_saving_a_part_refreshes_the_page(self):
+        self.client.get(reverse('part_list'))
+        self.parts[0].name = 'Part 00 renamed'
+        self.parts[0].save()
+        self.assertContains(self.client.get(reverse('part_list')), 'Part 00 renamed')
+        self.parts[1].delete()
+        self.assertNotContains(self.client.get(reverse('part_list')), 'Part 01')
+
+    def test_cached_cards_are_reused_for_new_pages(self):
+        self.client.get(reverse('part_list'))
+        catalog_cache.invalidate()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertContains(self.client.get(reverse('part_list')), 'Part 07')
+        # page rows and total count, the cards themselves come from the cache
+        self.assertEqual(len(queries), 2)
+
+
+class PartReviewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.part = models.PartService.objects.create(name='Brake pads', price=Decimal('40.00'))
+        self.readers = [
+            User.objects.create_user(username=f'reader{number}', password='secret') for number in range(3)
+        ]
+
+    def add_reviews(self, count):
+        return [
+            models.PartServiceReview.objects.create(
+                partservice=self.part, reviewer=self.readers[number % 3], content=f'Review {number:02}',
+            )
+            for number in range(count)
+        ]
+
+    def test_review_count_and_last_review_follow_writes(self):
+        first, second = self.add_reviews(2)
+        self.part.refresh_from_db()
+        self.assertEqual(self.part.review_count, 2)
+        self.assertEqual(self.part.last_reviewed_at, second.created_at)
+        second.delete()
+        self.part.refresh_from_db()
+        self.assertEqual(self.part.review_count, 1)
+        self.assertEqual(self.part.last_reviewed_at, first.created_at)
+        first.delete()
+        self.part.refresh_from_db()
+        self.assertEqual((self.part.review_count, self.part.last_reviewed_at), (0, None))
+
+    def test_refresh_repairs_counts_after_bulk_writes(self):
+        models.PartServiceReview.objects.bulk_create(
+            models.PartServiceReview(partservice=self.part, reviewer=self.readers[0], content='Bulk')
+            for number in range(4)
+        )
+        reviews.refresh()
+        self.part.refresh_from_db()
+        self.assertEqual(self.part.review_count, 4)
+        self.assertIsNotNone(self.part.last_reviewed_at)
+
+    def test_review_feed_pages_through_all_reviews(self):
+        self.add_reviews(reviews.FEED_PAGE_SIZE + 3)
+        url = reverse('part_detail', kwargs={'pk': self.part.pk})
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        page = response.context['page_obj']
+        self.assertEqual(len(page), reviews.FEED_PAGE_SIZE)
+        self.assertContains(response, 'Review 12')
+        response = self.client.get(url, {'cursor': page.next_cursor})
+        self.assertEqual(
+            [review.content for review in response.context['page_obj']], ['Review 02', 'Review 01', 'Review 00'],
+        )
+
+    def test_posted_review_is_counted_on_the_card(self):
+        self.client.force_login(self.readers[0])
+        self.client.get(reverse('part_list'))
+        self.client.post(reverse('review_create'), {
+            'content': 'Great', 'partservice': self.part.pk, 'reviewer': self.readers[0].pk,
+        })
+        self.assertContains(self.client.get(reverse('part_list')), '1 review<')
+
+
+class OrderTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        customer = User.objects.create_user(username='jonas', password='slaptazodis')
+        car_model = models.CarModel.objects.create(brand='Audi', model='A4', year=2010)
+        cls.car = models.Car.objects.create(
+            customer=customer, car_model=car_model, plate='ABC123', vin='VIN', color='black',
+        )
+        cls.oil = models.PartService.objects.create(name='Oil change', price=Decimal('40.00'))
+
+    def totals(self, order):
+        order.refresh_from_db()
+        return order.total_amount, order.line_count
+
+    def test_line_writes_keep_totals(self):
+        order = models.ServiceOrder.objects.create(car=self.car)
+        other = models.ServiceOrder.objects.create(car=self.car)
+        line = models.OrderLine.objects.create(order=order, part_service=self.oil, price=Decimal('40.00'))
+        models.OrderLine.objects.create(order=order, part_service=self.oil, quantity=2, price=Decimal('80.00'))
+        self.assertEqual(self.totals(order), (Decimal('120.00'), 2))
+        line.price = Decimal('35.50')
+        line.save()
+        self.assertEqual(self.totals(order), (Decimal('115.50'), 2))
+        line.order = other
+        line.save()
+        self.assertEqual(self.totals(order), (Decimal('80.00'), 1))
+        self.assertEqual(self.totals(other), (Decimal('35.50'), 1))
+        line.delete()
+        self.assertEqual(self.totals(other), (Decimal('0.00'), 0))
+
+    def test_place_order_stores_totals(self):
+        order = orders.place_order(self.car, [(self.oil, 1), (self.oil, 3)])
+        self.assertEqual(order.total_amount, Decimal('160.00'))
+        self.assertEqual(self.totals(order), (Decimal('160.00'), 2))
+
+    def test_command_finds_and_repairs_stale_totals(self):
+        order = orders.place_order(self.car, [(self.oil, 1)])
+        models.ServiceOrder.objects.filter(pk=order.pk).update(total_amount=0, line_count=5)
+        with self.assertRaises(CommandError):
+            call_command('verify_order_totals', stdout=io.StringIO())
+        call_command('verify_order_totals', repair=True, stdout=io.StringIO())
+        self.assertEqual(self.totals(order), (Decimal('40.00'), 1))
+        self.assertEqual(list(orders.stale_totals()), [])
+
+    def test_list_sorts_and_filters_by_value(self):
+        for quantity in (1, 3, 2):
+            orders.place_order(self.car, [(self.oil, quantity)])
+        response = self.client.get(reverse('serviceorder_list'), {'sort': 'value', 'min_total': '50'})
+        self.assertEqual(
+            [order.total_amount for order in response.context['service_orders']],
+            [Decimal('120.00'), Decimal('80.00')],
+        )
+
+
+class ReportRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='vadove', password='slaptazodis', is_staff=True)
+        customer = User.objects.create_user(username='jonas', password='slaptazodis')
+        cls.audi = models.Car.objects.create(
+            customer=customer, car_model=models.CarModel.objects.create(brand='Audi', model='A4', year=2010),
+            plate='ABC123', vin='VIN', color='black',
+        )
+        cls.bmw = models.Car.objects.create(
+            customer=customer, car_model=models.CarModel.objects.create(brand='BMW', model='X5', year=2015),
+            plate='XYZ999', vin='VIN', color='white',
+        )
+        cls.oil = models.PartService.objects.create(name='Oil change', price=Decimal('40.00'))
+        cls.pads = models.PartService.objects.create(name='Brake pads', price=Decimal('60.00'))
+
+    def setUp(self):
+        self.old_order = orders.place_order(self.audi, [(self.oil, 1)])
+        self.last_month = date.today().replace(day=1) - timedelta(days=1)
+        models.ServiceOrder.objects.filter(pk=self.old_order.pk).update(date=self.last_month, order_status=4)
+        reports.mark_days([self.last_month])
+        orders.place_order(self.audi, [(self.oil, 2), (self.pads, 1)])
+        orders.place_order(self.bmw, [(self.pads, 1)])
+        reports.refresh()
+
+    def test_rollups_sum_revenue_per_part_brand_and_status(self):
+        today = date.today()
+        self.assertEqual(
+            [(row['part_service__name'], row['quantity'], row['revenue']) for row in reports.revenue_by_part(today)],
+            [('Brake pads', 2, Decimal('120.00')), ('Oil change', 2, Decimal('80.00'))],
+        )
+        self.assertEqual(
+            [(row['brand'], row['order_count'], row['revenue']) for row in reports.revenue_by_brand(today)],
+            [('Audi', 1, Decimal('140.00')), ('BMW', 1, Decimal('60.00'))],
+        )
+        self.assertEqual(
+            [(row['status'], row['revenue']) for row in reports.revenue_by_status(self.last_month)],
+            [('completed', Decimal('40.00'))],
+        )
+        self.assertEqual(reports.monthly_revenue(status=4)[0]['revenue'], Decimal('40.00'))
+
+    def test_refresh_only_rebuilds_changed_days(self):
+        self.assertFalse(models.ReportDirtyDay.objects.exists())
+        self.assertEqual(reports.refresh(), 0)
+        order = orders.place_order(self.bmw, [(self.oil, 1)])
+        self.assertEqual(list(models.ReportDirtyDay.objects.values_list('day', flat=True)), [date.today()])
+        order.lines.get().delete()
+        self.assertEqual(reports.refresh(), 1)
+        # the last month's rows were left alone
+        self.assertEqual(reports.revenue_by_part(self.last_month)[0]['revenue'], Decimal('40.00'))
+        self.assertEqual(sum(row['order_count'] for row in reports.revenue_by_brand(date.today())), 3)
+
+    def test_report_view_reads_only_rollups(self):
+        self.client.force_login(self.staff)
+        # user, dirty days, then the monthly, part, brand and status rollups, the session is cached
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('report'), {'month': date.today().strftime('%Y-%m')})
+        self.assertContains(response, 'Brake pads')
+        self.assertContains(response, '€200.00')
+        self.assertEqual(self.client.get(reverse('report'), {'month': 'soon'}).status_code, 400)
+
+    def test_command_rebuilds_everything_with_full(self):
+        models.DailyPartRollup.objects.all().delete()
+        output = io.StringIO()
+        call_command('refresh_reports', full=True, stdout=output)
+        self.assertIn('Refreshed 2 days', output.getvalue())
+        self.assertEqual(models.DailyPartRollup.objects.count(), 3)
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='jonas', password='slaptazodis')
+        car = models.Car.objects.create(
+            customer=cls.customer, car_model=models.CarModel.objects.create(brand='Audi', model='A4', year=2010),
+            plate='ABC123', vin='VIN', color='black',
+        )
+        cls.oil = models.PartService.objects.create(name='Oil change', price=Decimal('40.00'))
+        models.PartServiceReview.objects.create(partservice=cls.oil, reviewer=cls.customer, content='Quick job')
+        orders.place_order(car, [(cls.oil, 2)])
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_async_pages_render_like_the_sync_ones(self):
+        pages = (
+            ('async_index', {}, 'Orders: 1'),
+            ('async_part_list', {}, 'Oil change'),
+            ('async_brand_list', {}, 'Audi'),
+            ('async_part_detail', {'pk': self.oil.pk}, 'Quick job'),
+            ('async_serviceorder_list', {}, '€80.00'),
+        )
+        for name, kwargs, text in pages:
+            with self.subTest(name):
+                response = await self.async_client.get(reverse(name, kwargs=kwargs))
+                self.assertContains(response, text)
+
+    async def test_missing_part_is_not_found(self):
+        response = await self.async_client.get(reverse('async_part_detail', kwargs={'pk': 0}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_cached_part_page_needs_no_catalog_query(self):
+        self.client.get(reverse('part_list'))
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(reverse('async_part_list')), 'Oil change')
+
+    def test_benchmark_compares_asgi_with_wsgi(self):
+        results = benchmark.run_asgi(self.customer, iterations=2, concurrency=2)
+        self.assertEqual(set(results), set(benchmark.ASYNC_ROUTES.values()))
+        self.assertEqual(results['part_detail']['asgi']['status'], ['200'])
+        self.assertEqual(results['index']['wsgi']['status'], ['200'])
+
+
+class SqliteSetupTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'stress.sqlite3')
+
+    def test_concurrent_order_writes_are_never_locked_out(self):
+        results = sqlite.stress(self.path, workers=6, transactions=15)
+        self.assertEqual(results, {'committed': 90, 'locked': 0})
+
+    def test_new_connections_get_the_pragmas(self):
+        sqlite.stress(self.path, workers=1, transactions=1)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['cache_size'])
+        with open(self.path, 'rb') as database:
+            # file format bytes 18 and 19 are 2 once the database is in WAL mode
+            self.assertEqual(database.read(20)[18:20], b'\x02\x02')
+
+    def test_unknown_pragmas_are_rejected(self):
+        with self.assertRaises(ValueError):
+            list(sqlite.pragma_statements({'writable_schema': 1}))
+        with self.assertRaises(ValueError):
+            list(sqlite.pragma_statements({'journal_mode': 'wal; DROP TABLE library_car'}))
+
+    def test_immediate_atomic_nests_in_open_transactions(self):
+        with sqlite.immediate_atomic():
+            models.PartService.objects.create(name='Oil change', price=Decimal('40.00'))
+        self.assertTrue(models.PartService.objects.exists())
+
+
+@override_settings(REPLICA_DATABASE='replica')
+class ReplicaRouterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='jonas', password='slaptazodis')
+        cls.car = models.Car.objects.create(
+            customer=cls.customer, car_model=models.CarModel.objects.create(brand='Audi', model='A4', year=2010),
+            plate='ABC123', vin='VIN', color='black',
+        )
+        cls.oil = models.PartService.objects.create(name='Oil change', price=Decimal('40.00'))
+
+    def test_reads_route_to_the_replica_inside_read_only_views(self):
+        token = routers._use_replica.set(True)
+        try:
+            self.assertEqual(models.PartService.objects.all().db, 'replica')
+            self.assertEqual(models.Car.objects.filter(customer=self.customer).db, 'replica')
+            self.assertEqual(routers.read_database(), 'replica')
+        finally:
+            routers._use_replica.reset(token)
+        self.assertEqual(models.PartService.objects.all().db, 'default')
+
+    def test_writes_and_sessions_stay_on_the_primary(self):
+        router = routers.ReplicaRouter()
+        token = routers._use_replica.set(True)
+        try:
+            self.assertEqual(router.db_for_write(models.ServiceOrder), 'default')
+            self.assertIsNone(router.db_for_read(Session))
+        finally:
+            routers._use_replica.reset(token)
+        self.assertFalse(router.allow_migrate('replica', 'library'))
+
+    def test_view_reads_use_the_replica_until_the_session_writes(self):
+        self.client.force_login(self.customer)
+        seen = []
+
+        @routers.read_only
+        def view(request):
+            seen.append(models.PartService.objects.all().db)
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        request.user = self.customer
+        view(request)
+        self.client.post(reverse('place_order', kwargs={'car_id': self.car.pk}), {
+            'form-TOTAL_FORMS': 1, 'form-INITIAL_FORMS': 0,
+            'form-0-part_service': self.oil.pk, 'form-0-quantity': 1,
+        })
+        request.session = self.client.session
+        self.assertTrue(routers.is_sticky(request))
+        view(request)
+        self.assertEqual(seen, ['replica', 'default'])
+
+    def test_sync_copies_the_database(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        source, target = (os.path.join(directory.name, name) for name in ('primary.sqlite3', 'replica.sqlite3'))
+        with sqlite3.connect(source) as primary:
+            primary.execute('CREATE TABLE part (name TEXT)')
+            primary.execute("INSERT INTO part VALUES ('Oil change')")
+        primary.close()
+        routers.sync_replica(source, target)
+        with sqlite3.connect(target) as replica:
+            self.assertEqual(replica.execute('SELECT name FROM part').fetchall(), [('Oil change',)])
+        replica.close()
+
+
+class VisitCounterTests(TestCase):
+    def setUp(self):
+        visits.buffer.clear()
+        self.addCleanup(visits.buffer.clear)
+
+    def test_repeated_home_page_hits_do_not_write(self):
+        self.assertEqual(self.client.get(reverse('index')).context['num_visits'], 1)
+        with CaptureQueriesContext(connection) as queries:
+            for expected in (2, 3):
+                self.assertEqual(self.client.get(reverse('index')).context['num_visits'], expected)
+        writes = [query['sql'] for query in queries if not query['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(writes, [])
+        # the stored count is read on the first visit with the cookie only
+        reads = [query['sql'] for query in queries if 'library_visitcount' in query['sql']]
+        self.assertEqual(len(reads), 1)
+        self.assertFalse(models.VisitCount.objects.exists())
+        self.assertFalse(Session.objects.exists())
+
+    @override_settings(VISIT_FLUSH_SIZE=1)
+    def test_one_off_visitors_are_not_stored(self):
+        for _ in range(3):
+            self.client_class().get(reverse('index'))
+        self.assertFalse(models.VisitCount.objects.exists())
+        self.assertEqual(visits.buffer.flush(), 0)
+
+    @override_settings(VISIT_FLUSH_SIZE=3)
+    def test_visits_are_written_in_batches(self):
+        user = User.objects.create_user(username='jonas', password='slaptazodis')
+        other = self.client_class()
+        other.force_login(user)
+        # the first anonymous visit, before the cookie, is not buffered
+        for _ in range(3):
+            self.client.get(reverse('index'))
+        self.assertFalse(models.VisitCount.objects.exists())
+        self.assertEqual(other.get(reverse('index')).context['num_visits'], 1)
+        counts = dict(models.VisitCount.objects.values_list('visitor', 'count'))
+        self.assertEqual(counts[f'user:{user.pk}'], 1)
+        self.assertEqual(sorted(counts.values()), [1, 2])
+        # the stored count, the pending visits and the first visit add up
+        self.assertEqual(self.client.get(reverse('index')).context['num_visits'], 4)
+        self.assertEqual(visits.buffer.flush(), 1)
+        self.assertEqual(sorted(models.VisitCount.objects.values_list('count', flat=True)), [1, 3])
+        self.assertEqual(self.client.get(reverse('index')).context['num_visits'], 5)
+
+    def test_visitor_cookie_is_signed(self):
+        self.client.cookies[visits.COOKIE_NAME] = 'forged'
+        response = self.client.get(reverse('index'))
+        self.assertIn(visits.COOKIE_NAME, response.cookies)
+        self.assertNotEqual(response.cookies[visits.COOKIE_NAME].value, 'forged')
+
+
+class QueryPlanTests(TestCase):
+    # enough rows that after ANALYZE the planner picks an index because it
+    # is cheaper, not because it knows nothing about the tables
+    CUSTOMERS = 200
+    CARS_PER_CUSTOMER = 3
+    ORDERS_PER_CAR = 4
+    PARTS = 200
+    DAYS = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='admin', password='slaptazodis', is_staff=True)
+        cls.customer = User.objects.create_user(username='jonas', password='slaptazodis')
+        cls.car_model = models.CarModel.objects.create(brand='Audi', model='A4', year=2010)
+        cls.car = models.Car.objects.create(
+            customer=cls.customer, car_model=cls.car_model, plate='ABC123', vin='VIN', color='black',
+        )
+        cls.oil = models.PartService.objects.create(name='Oil change', price=Decimal('40.00'))
+        cls.order = models.ServiceOrder.objects.create(car=cls.car)
+        models.OrderLine.objects.create(order=cls.order, part_service=cls.oil, quantity=1, price=cls.oil.price)
+        models.PartServiceReview.objects.create(partservice=cls.oil, reviewer=cls.customer, content='Good')
+        cls.seed()
+        reports.refresh(full=True)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    @classmethod
+    def seed(cls):
+        # bulk_create skips the signals, the totals and rollups are rebuilt after
+        customers = User.objects.bulk_create(
+            User(username=f'customer{number}') for number in range(cls.CUSTOMERS)
+        )
+        car_models = models.CarModel.objects.bulk_create(
+            models.CarModel(brand=f'Brand {number % 20}', model=f'Model {number}', year=2000 + number % 20)
+            for number in range(100)
+        )
+        parts = models.PartService.objects.bulk_create(
+            models.PartService(name=f'Part {number}', price=Decimal(10 + number % 90)) for number in range(cls.PARTS)
+        )
+        cars = models.Car.objects.bulk_create(
+            models.Car(
+                customer=customer, car_model=car_models[(number * 7 + index) % len(car_models)],
+                plate=f'{number:03}{index:03}', vin=f'VIN{number}{index}', color='black',
+            )
+            for number, customer in enumerate(customers) for index in range(cls.CARS_PER_CUSTOMER)
+        )
+        service_orders = models.ServiceOrder.objects.bulk_create(
+            models.ServiceOrder(car=car, order_status=(number + index) % len(models.ORDER_STATUS))
+            for number, car in enumerate(cars) for index in range(cls.ORDERS_PER_CAR)
+        )
+        models.OrderLine.objects.bulk_create(
+            models.OrderLine(order=order, part_service=part, quantity=1, price=part.price)
+            for number, order in enumerate(service_orders)
+            for part in (parts[number % cls.PARTS], parts[(number * 13 + 1) % cls.PARTS])
+        )
+        models.PartServiceReview.objects.bulk_create(
+            models.PartServiceReview(partservice=parts[number % cls.PARTS], reviewer=customer, content='Fine')
+            for number, customer in enumerate(customers)
+        )
+        # date is auto_now, spread the orders over the past days
+        order_ids = [order.pk for order in service_orders]
+        for day in range(cls.DAYS):
+            models.ServiceOrder.objects.filter(pk__in=order_ids[day::cls.DAYS]).update(
+                date=date.today() - timedelta(days=day),
+            )
+        orders.refresh_totals()
+        search.reindex_orders(order_ids)
+
+    def assertNoFullScans(self, user, name, kwargs=None, data=None, method='get', allowed=()):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(reverse(name, kwargs=kwargs), data)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400)
+        self.assertTrue(queries.captured_queries)
+        scans = query_plans.full_scans(queries, allowed=allowed)
+        self.assertEqual(scans, [], f'{name} scans whole tables')
+
+    def test_customer_pages(self):
+        car = {'car_id': self.car.pk}
+        for name, kwargs in (
+            ('index', None), ('part_list', None), ('part_detail', {'pk': self.oil.pk}),
+            ('brand_list', None), ('brand_detail', {'brand': 'Audi'}),
+            ('serviceorder_list', None), ('my_cars', None), ('car_service_orders', car), ('place_order', car),
+        ):
+            with self.subTest(name):
+                self.assertNoFullScans(self.customer, name, kwargs)
+
+    def test_cancel_order(self):
+        self.assertNoFullScans(self.customer, 'cancel_order', {'order_id': self.order.pk}, method='post')
+
+    def test_staff_pages(self):
+        # the rollup tables hold one row per day and the dirty days are a short queue
+        self.assertNoFullScans(self.staff, 'report', allowed={'library_dailystatusrollup', 'library_reportdirtyday'})
+        self.assertNoFullScans(self.staff, 'customer_list')
+        self.assertNoFullScans(self.staff, 'customer_detail', {'pk': self.customer.pk})
+        today = date.today().isoformat()
+        self.assertNoFullScans(self.staff, 'export_orders', data={'date_from': today, 'date_to': today})
+        self.assertNoFullScans(self.staff, 'export_orders', data={'status': 0, 'date_from': today})
+
+    def test_hot_paths_use_the_composite_indexes(self):
+        plans = {
+            'library_car_customer_plate_idx': models.Car.objects.filter(customer=self.customer),
+            'library_so_car_date_idx': models.ServiceOrder.objects.filter(car=self.car).order_by('-date'),
+            'library_so_status_date_idx': models.ServiceOrder.objects.filter(
+                order_status=0, date__gte=date.today(),
+            ).order_by('date'),
+            'library_ol_order_part_idx': models.OrderLine.objects.filter(order=self.order, part_service=self.oil),
+        }
+        for index, queryset in plans.items():
+            with self.subTest(index):
+                sql, params = queryset.query.sql_with_params()
+                steps = query_plans.explain(sql, params)
+                self.assertTrue(any(index in step for step in steps), steps)
+                self.assertFalse(any('TEMP B-TREE' in step for step in steps), steps)
+
+
+class CarServiceHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='jonas', password='slaptazodis')
+        cls.other = User.objects.create_user(username='petras', password='slaptazodis')
+        car_model = models.CarModel.objects.create(brand='Audi', model='A4', year=2010)
+        cls.car = models.Car.objects.create(
+            customer=cls.customer, car_model=car_model, plate='ABC123', vin='VIN', color='black',
+        )
+        cls.parts = models.PartService.objects.bulk_create(
+            models.PartService(name=f'Part {number}', price=Decimal('10.00')) for number in range(3)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.customer)
+        self.url = reverse('car_service_orders', kwargs={'car_id': self.car.pk})
+
+    def create_orders(self, count):
+        for day in range(count):
+            order = models.ServiceOrder.objects.create(car=self.car)
+            models.OrderLine.objects.bulk_create(
+                models.OrderLine(order=order, part_service=part, quantity=1, price=part.price) for part in self.parts
+            )
+            # date is auto_now, spread the visits over the past days
+            models.ServiceOrder.objects.filter(pk=order.pk).update(date=date.today() - timedelta(days=day))
+        orders.refresh_totals()
+
+    def test_car_without_orders(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'No service orders for this car yet.')
+
+    def test_only_the_owner_sees_the_history(self):
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_newest_first_with_lines_and_totals(self):
+        self.create_orders(12)
+        response = self.client.get(self.url)
+        page = response.context['service_orders']
+        self.assertEqual(len(page), 10)
+        self.assertEqual([order.date for order in page], sorted((order.date for order in page), reverse=True))
+        self.assertEqual(page[0].date, date.today())
+        self.assertEqual(response.context['history']['visits'], 12)
+        self.assertEqual(response.context['history']['spent'], Decimal('360.00'))
+        self.assertContains(response, 'Part 2')
+        self.assertContains(response, '€30.00 (3 lines)')
+        next_page = self.client.get(self.url, {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(len(next_page.context['service_orders']), 2)
+
+    def test_query_count_does_not_grow_with_visits(self):
+        self.create_orders(2)
+        # the session is cached after the first request
+        self.client.get(self.url)
+        # user, car with model, history summary, orders page, lines with parts
+        with self.assertNumQueries(5):
+            self.client.get(self.url)
+        self.create_orders(30)
+        with self.assertNumQueries(5):
+            self.client.get(self.url)
+
+
+class CarModelResolverTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='jonas', password='slaptazodis')
+        cls.golf = models.CarModel.objects.create(brand='Volkswagen', model='Golf', year=2010)
+        models.CarModel.objects.create(brand='Volkswagen', model='Passat', year=2012)
+        models.CarModel.objects.create(brand='Volvo', model='XC90', year=2015)
+        models.CarModel.objects.create(brand='Mercedes-Benz', model='C-Class', year=2014)
+
+    def setUp(self):
+        # the index outlives the rolled back rows of other tests
+        car_models.invalidate()
+
+    def test_aliases_and_spelling_resolve_to_the_catalog(self):
+        self.assertEqual(car_models.resolve('VW', 'golf', 2010), ('Volkswagen', 'Golf', self.golf.pk))
+        self.assertEqual(car_models.resolve(' volkswagen ', 'GOLF', 2011), ('Volkswagen', 'Golf', None))
+        self.assertEqual(car_models.resolve('mercedes benz', 'c class', 2014)[:2], ('Mercedes-Benz', 'C-Class'))
+        self.assertEqual(car_models.resolve('Merc', 'E', 2016), ('Mercedes-Benz', 'E', None))
+        self.assertEqual(car_models.resolve('Tesla', 'Model 3', 2020), ('Tesla', 'Model 3', None))
+
+    def test_add_car_reuses_the_catalog_entry(self):
+        self.client.force_login(self.customer)
+        response = self.client.post(reverse('add_car'), {
+            'brand': 'vw', 'model': 'golf', 'year': 2010, 'plate': 'ABC123', 'vin': 'VIN', 'color': 'black',
+        })
+        self.assertRedirects(response, reverse('user_car_list'))
+        self.assertEqual(models.Car.objects.get().car_model, self.golf)
+        self.client.post(reverse('add_car'), {
+            'brand': 'VW', 'model': 'golf', 'year': 2019, 'plate': 'DEF456', 'vin': 'VIN', 'color': 'red',
+        })
+        self.assertTrue(models.CarModel.objects.filter(brand='Volkswagen', model='Golf', year=2019).exists())
+        self.assertEqual(models.CarModel.objects.count(), 5)
+
+    def test_add_car_checks_a_stale_index(self):
+        index = car_models.get_index()
+        deleted_pk = self.golf.pk
+        self.golf.delete()
+        # another process still holding the index from before the delete
+        car_models._loaded = (index, car_models.current_version())
+        self.client.force_login(self.customer)
+        self.client.post(reverse('add_car'), {
+            'brand': 'VW', 'model': 'Golf', 'year': 2010, 'plate': 'ABC123', 'vin': 'VIN', 'color': 'black',
+        })
+        car_model = models.Car.objects.get().car_model
+        self.assertEqual((car_model.brand, car_model.model, car_model.year), ('Volkswagen', 'Golf', 2010))
+        self.assertNotEqual(car_model.pk, deleted_pk)
+
+    def test_autocomplete_does_not_query(self):
+        url = reverse('car_model_autocomplete')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            brands = self.client.get(url, {'q': 'vo'}).json()['results']
+            aliased = self.client.get(url, {'q': 'v'}).json()['results']
+            golf = self.client.get(url, {'brand': 'vw', 'q': 'g'}).json()['results']
+        self.assertEqual(brands, [{'brand': 'Volkswagen'}, {'brand': 'Volvo'}])
+        self.assertEqual(aliased, [{'brand': 'Volkswagen'}, {'brand': 'Volvo'}])
+        self.assertEqual(golf, [{'brand': 'Volkswagen', 'model': 'Golf', 'years': [2010]}])
+
+    def test_index_follows_car_model_changes(self):
+        url = reverse('car_model_autocomplete')
+        self.assertEqual(self.client.get(url, {'q': 'au'}).json()['results'], [])
+        audi = models.CarModel.objects.create(brand='Audi', model='A4', year=2010)
+        self.assertEqual(self.client.get(url, {'q': 'au'}).json()['results'], [{'brand': 'Audi'}])
+        audi.delete()
+        self.assertEqual(self.client.get(url, {'q': 'au'}).json()['results'], [])
+
+
+class BrandHierarchyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='jonas', password='slaptazodis')
+        a4 = models.CarModel.objects.create(brand='Audi', model='A4', year=2010)
+        # a duplicate catalog row folds into the same year
+        a4_again = models.CarModel.objects.create(brand='Audi', model='A4', year=2010)
+        models.CarModel.objects.create(brand='Audi', model='A4', year=2012)
+        models.CarModel.objects.create(brand='Audi', model='A6', year=2012)
+        models.CarModel.objects.create(brand='BMW', model='X5', year=2015)
+        cls.cars = [
+            models.Car.objects.create(customer=cls.customer, car_model=car_model, plate=plate, vin='VIN', color='black')
+            for car_model, plate in ((a4, 'AAA111'), (a4_again, 'BBB222'))
+        ]
+        for car in (cls.cars[0], cls.cars[0], cls.cars[1]):
+            models.ServiceOrder.objects.create(car=car)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_brands_are_listed_once_with_their_counts(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('brand_list'))
+        self.assertEqual([brand['brand'] for brand in response.context['brand_list']], ['Audi', 'BMW'])
+        audi = brands.get_hierarchy()['Audi']
+        self.assertEqual((audi['car_count'], audi['order_count'], audi['year_count']), (2, 3, 3))
+        self.assertEqual([model['model'] for model in audi['models']], ['A4', 'A6'])
+        self.assertEqual(audi['models'][0]['years'], [
+            {'year': 2010, 'car_count': 2, 'order_count': 3},
+            {'year': 2012, 'car_count': 0, 'order_count': 0},
+        ])
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(reverse('brand_detail', kwargs={'brand': 'Audi'})), 'A6')
+        self.assertEqual(self.client.get(reverse('brand_detail', kwargs={'brand': 'Opel'})).status_code, 404)
+
+    def test_counts_follow_cars_and_orders(self):
+        brands.get_hierarchy()
+        car = models.Car.objects.create(
+            customer=self.customer, car_model=models.CarModel.objects.get(brand='BMW'),
+            plate='CCC333', vin='VIN', color='red',
+        )
+        self.assertEqual(brands.get_hierarchy()['BMW']['car_count'], 1)
+        order = models.ServiceOrder.objects.create(car=car)
+        self.assertEqual(brands.get_hierarchy()['BMW']['order_count'], 1)
+        order.order_status = 2
+        order.save()
+        # a status change keeps the cached counts
+        with self.assertNumQueries(0):
+            brands.get_hierarchy()
+        models.CarModel.objects.create(brand='Opel', model='Astra', year=2008)
+        self.assertIn('Opel', brands.get_hierarchy())
+
+
+class CustomerDetailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.jonas = User.objects.create_user(username='jonas', password='slaptazodis')
+        petras = User.objects.create_user(username='petras', password='slaptazodis')
+        cls.a4 = models.CarModel.objects.create(brand='Audi', model='A4', year=2010)
+        x5 = models.CarModel.objects.create(brand='BMW', model='X5', year=2015)
+        cls.audi = models.Car.objects.create(customer=cls.jonas, car_model=cls.a4, plate='AAA111', vin='VIN', color='black')
+        cls.bmw = models.Car.objects.create(customer=cls.jonas, car_model=x5, plate='BBB222', vin='VIN', color='red')
+        # same model, other customer, must not show up
+        models.Car.objects.create(customer=petras, car_model=cls.a4, plate='CCC333', vin='VIN', color='blue')
+        cls.oil = models.PartService.objects.create(name='Oil change', price=Decimal('40.00'))
+        cls.tyres = models.PartService.objects.create(name='Tyres', price=Decimal('100.00'))
+        orders.place_order(cls.audi, [(cls.oil, 1)])
+        orders.place_order(cls.bmw, [(cls.oil, 1), (cls.tyres, 2)])
+        cancelled = orders.place_order(cls.bmw, [(cls.tyres, 4)])
+        models.ServiceOrder.objects.filter(pk=cancelled.pk).update(order_status=2)
+        cls.staff = User.objects.create_user(username='admin', password='slaptazodis', is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_only_staff_see_customers(self):
+        self.client.force_login(self.jonas)
+        response = self.client.get(reverse('customer_detail', kwargs={'pk': self.jonas.pk}))
+        self.assertEqual(response.status_code, 302)
+
+    def test_shows_the_customers_cars_orders_and_spend(self):
+        response = self.client.get(reverse('customer_detail', kwargs={'pk': self.jonas.pk}))
+        self.assertEqual(response.context['customer'], self.jonas)
+        cars = {car.plate: car for car in response.context['cars']}
+        self.assertEqual(set(cars), {'AAA111', 'BBB222'})
+        self.assertEqual((cars['AAA111'].order_count, cars['BBB222'].order_count), (1, 2))
+        summary = response.context['summary']
+        self.assertEqual(summary['order_count'], 3)
+        # the cancelled order is not money spent
+        self.assertEqual(summary['spent'], Decimal('280.00'))
+        self.assertEqual(summary['last_visit'], date.today())
+        self.assertEqual(len(response.context['recent_orders']), 3)
+        self.assertContains(response, 'Tyres</a> x 2')
+        self.assertContains(response, '€280.00 spent')
+
+    def test_customer_list_links_to_the_customer(self):
+        response = self.client.get(reverse('customer_list'))
+        self.assertContains(response, reverse('customer_detail', kwargs={'pk': self.jonas.pk}))
+
+    def test_query_count_does_not_grow_with_orders(self):
+        url = reverse('customer_detail', kwargs={'pk': self.jonas.pk})
+        # staff user, customer, cars with their counts, summary, recent orders, their lines
+        with self.assertNumQueries(6):
+            self.client.get(url)
+        for number in range(15):
+            orders.place_order(self.audi, [(self.oil, 1), (self.tyres, 1)])
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['recent_orders']), views.CUSTOMER_RECENT_ORDERS)
+
+    def test_unknown_customer_is_not_found(self):
+        self.assertEqual(self.client.get(reverse('customer_detail', kwargs={'pk': 0})).status_code, 404)
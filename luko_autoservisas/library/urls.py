@@ -1,20 +1,29 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('parts/', views.parts, name='part_list'),
     path('brands/', views.brand_list, name='brand_list'),
-    path('brand/<int:pk>/', views.brand_detail, name='brand_detail'),
+    path('brand/<str:brand>/', views.brand_detail, name='brand_detail'),
     path('customers/', views.customer_list, name='customer_list'),  
     path('customer/<int:pk>/', views.customer_detail, name='customer_detail'),
     path('serviceorder-list/', views.ServiceListView.as_view(), name='serviceorder_list'),
     path('user_car_list/', views.UserCarListView.as_view(), name='user_car_list'),
     path('add_car/', views.AddCarView.as_view(), name='add_car'),
+    path('car-models/autocomplete/', views.car_model_autocomplete, name='car_model_autocomplete'),
     path('my_cars/', views.UserCarListView.as_view(), name='my_cars'),
-    path('car/<int:car_id>/service-orders/', views.CarServiceOrderListView.as_view(), name='car_service_orders'),
+    path('car/<int:car_id>/service-orders/', views.CarServiceHistoryView.as_view(), name='car_service_orders'),
     path('place_order/<int:car_id>/', views.PlaceOrderView.as_view(), name='place_order'),
     path('cancel-order/<int:order_id>/', views.cancel_order, name='cancel_order'),
     path('review/create/', views.review_create, name='review_create'),
     path('parts/<int:pk>/', views.PartServiceDetailView.as_view(), name='part_detail'),
+    path('parts/autocomplete/', views.part_autocomplete, name='part_autocomplete'),
+    path('export/orders/', views.export_orders, name='export_orders'),
+    path('reports/', views.report, name='report'),
+    path('async/', async_views.index, name='async_index'),
+    path('async/parts/', async_views.parts, name='async_part_list'),
+    path('async/parts/<int:pk>/', async_views.part_detail, name='async_part_detail'),
+    path('async/brands/', async_views.brand_list, name='async_brand_list'),
+    path('async/serviceorder-list/', async_views.order_list, name='async_serviceorder_list'),
 ]   
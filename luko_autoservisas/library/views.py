@@ -1,12 +1,16 @@
+from datetime import date
 from typing import Any
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.paginator import Paginator
-from django.http import HttpResponse, HttpRequest
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, HttpRequest, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect, reverse
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import urlencode
 from django.views import generic
+from django.db.models import Count, Exists, Max, Min, OuterRef, Sum
 from django.db.models.query import QuerySet, Q
-from . import models, forms
+from . import brands, car_models, catalog_cache, models, exports, forms, orders, pagination, reports, reviews, routers, search, sqlite, stats, visits
 
 
 class AddCarView(LoginRequiredMixin, generic.edit.FormView):
@@ -14,69 +18,74 @@ class AddCarView(LoginRequiredMixin, generic.edit.FormView):
     form_class = forms.AddCarForm
 
     def form_valid(self, form):
-        car_model, created = models.CarModel.objects.get_or_create(
-            brand=form.cleaned_data['brand'],
-            model=form.cleaned_data['model'],
-            year=form.cleaned_data['year']
+        # "vw golf" and "Volkswagen Golf" are the same catalog entry
+        brand, model, car_model_id = car_models.resolve(
+            form.cleaned_data['brand'], form.cleaned_data['model'], form.cleaned_data['year'],
         )
+        if car_model_id is not None and not models.CarModel.objects.filter(pk=car_model_id).exists():
+            # deleted since this process loaded the index
+            car_models.invalidate()
+            car_model_id = None
+        if car_model_id is None:
+            car_model_id = models.CarModel.objects.get_or_create(
+                brand=brand, model=model, year=form.cleaned_data['year'],
+            )[0].pk
         new_car = models.Car(
             customer=self.request.user,
-            car_model=car_model,
+            car_model_id=car_model_id,
             plate=form.cleaned_data['plate'],
             vin=form.cleaned_data['vin'],
             color=form.cleaned_data['color']
         )
         new_car.save()
+        routers.wrote(self.request)
 
         return redirect('user_car_list')
 
 
 class PlaceOrderView(generic.edit.FormView):
     template_name = 'library/order_form.html'
-    form_class = forms.OrderForm
+    form_class = forms.OrderLineFormSet
 
     def form_valid(self, form):
-        car_id = self.kwargs['car_id']
-        car = get_object_or_404(models.Car, pk=car_id)
-        part_service = form.cleaned_data['part_service']
-        quantity = form.cleaned_data['quantity']
-        cancel_order = form.cleaned_data.get('cancel_order')
-
-        if cancel_order:
-            service_order = models.ServiceOrder.objects.create(
-                car=car, status=3 
-            )
-            messages.success(self.request, 'Order canceled successfully.')
-        else:
-            service_order = models.ServiceOrder.objects.create(car=car)
-
-            models.OrderLine.objects.create(
-                order=service_order,
-                part_service=part_service,
-                quantity=quantity,
-                price=part_service.price * quantity,
-            )
-
-            messages.success(self.request, 'Order placed successfully.')
-        
+        car = get_object_or_404(models.Car, pk=self.kwargs['car_id'])
+        orders.place_order(car, [
+            (form.part_services[part_service_id], quantity)
+            for part_service_id, quantity in form.lines
+        ])
+        routers.wrote(self.request)
+        messages.success(self.request, 'Order placed successfully.')
         return redirect('user_car_list')
 
 
-class CarServiceOrderListView(LoginRequiredMixin, generic.ListView):
-    model = models.ServiceOrder
-    template_name = 'library/serviceorder_list.html'
+class CarServiceHistoryView(LoginRequiredMixin, pagination.CursorPaginationMixin, generic.ListView):
+    """The service history of one of the user's cars, newest visit first."""
+    template_name = 'library/car_service_history.html'
     context_object_name = 'service_orders'
+    paginate_by = 10
+    count_total = False
+    cursor_ordering = ('-date', '-pk')
+
+    def get(self, request, *args, **kwargs):
+        # read once, and someone else's car is simply not found
+        self.car = get_object_or_404(
+            models.Car.objects.select_related('car_model'), pk=kwargs['car_id'], customer=request.user,
+        )
+        return super().get(request, *args, **kwargs)
 
     def get_queryset(self):
-        customer = self.request.user
-        car = get_object_or_404(models.Car, pk=self.kwargs['car_id'])
-        return models.ServiceOrder.objects.filter(car=car, car__customer=customer)
+        return models.ServiceOrder.objects.filter(car=self.car).with_lines()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        car = get_object_or_404(models.Car, pk=self.kwargs['car_id'])
-        context['car'] = car
-        context['date'] = models.ServiceOrder.objects.filter(car=car, car__customer=self.request.user).first().date
+        context['car'] = self.car
+        # the whole history, not only this page, in one grouped query
+        context['history'] = models.ServiceOrder.objects.filter(car=self.car).aggregate(
+            visits=Count('pk'),
+            spent=Sum('total_amount', filter=~Q(order_status__in=orders.UNPAID_STATUSES)),
+            first_visit=Min('date'),
+            last_visit=Max('date'),
+        )
         return context
 
 
@@ -90,28 +99,48 @@ class UserCarListView(LoginRequiredMixin, generic.ListView):
         user = self.request.user
         return models.Car.objects.filter(customer=user)
 
-class ServiceListView(generic.ListView):
+class ServiceListView(pagination.CursorPaginationMixin, generic.ListView):
     model = models.ServiceOrder
     template_name = 'service_list.html'
     context_object_name = 'service_orders'
     paginate_by = 8 #kiek irasu rodyti puslapyje
+    count_total = False
+
+    def get_filter_form(self):
+        if not hasattr(self, 'filter_form'):
+            self.filter_form = forms.OrderListFilterForm(self.request.GET)
+            self.filter_form.is_valid()
+        return self.filter_form
+
+    def get_cursor_ordering(self):
+        # the stored total_amount is indexed, sorting by value needs no join;
+        # by default the orders come grouped by car in library_so_car_date_idx order
+        sort = self.get_filter_form().cleaned_data.get('sort')
+        ordering = {'value': ('-total_amount', 'pk'), '-value': ('total_amount', 'pk')}.get(sort, ('car_id', 'date', 'pk'))
+        if search.tokenize(self.request.GET.get('query')):
+            return ('-exact_match', *ordering)
+        return ordering
  
     def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
         context =  super().get_context_data(**kwargs)
         context['search'] = True
+        context['filter_form'] = self.get_filter_form()
+        context['pager_params'] = self.get_pager_params()
         return context
+
+    def get_pager_params(self):
+        # keeps sorting and value filters on the pager links
+        return urlencode({
+            name: value for name, value in self.request.GET.items()
+            if name in self.get_filter_form().fields and value
+        })
     
     def get_queryset(self) -> QuerySet[Any]:
-        queryset =  super().get_queryset()
+        queryset =  super().get_queryset().with_details()
         query = self.request.GET.get('query')
         if query:
-            queryset = queryset.filter(
-                Q(pk__icontains=query) |
-                Q(date__icontains=query) |
-                Q(car__customer__istartswith=query) |
-                Q(lines__part_service__name__icontains=query)
-            )
-        return queryset
+            queryset = search.search_orders(queryset, query)
+        return self.get_filter_form().filter(queryset)
 
 
 class PartServiceDetailView(generic.edit.FormMixin, generic.DetailView):
@@ -122,10 +151,20 @@ class PartServiceDetailView(generic.edit.FormMixin, generic.DetailView):
 
     def get_initial(self):
         initial = super().get_initial()
-        initial['partservice'] = self.get_object()
+        # self.object is already loaded by get() and post(), no second lookup
+        initial['partservice'] = self.object
         initial['reviewer'] = self.request.user
         return initial
 
+    def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        paginator = pagination.CursorPaginator(
+            reviews.review_feed(self.object.pk), reviews.FEED_PAGE_SIZE,
+            ordering=reviews.FEED_ORDERING, count_total=False,
+        )
+        context['page_obj'] = paginator.get_page(self.request.GET.get('cursor'))
+        return context
+
     def post(self, *args, **kwargs) ->HttpResponse:
         self.object = self.get_object()
         form = self.get_form()
@@ -137,7 +176,9 @@ class PartServiceDetailView(generic.edit.FormMixin, generic.DetailView):
     def form_valid(self, form) -> HttpResponse:
         form.instance.partservice = self.object
         form.instance.reviewer = self.request.user
-        form.save()
+        with sqlite.immediate_atomic():
+            form.save()
+        routers.wrote(self.request)
         messages.success(self.request, 'Review added successfully.')
         return super().form_valid(form)
 
@@ -146,60 +187,143 @@ class PartServiceDetailView(generic.edit.FormMixin, generic.DetailView):
 
 
 def cancel_order(request, order_id):
-    order = get_object_or_404(models.ServiceOrder, pk=order_id)
-    if order.order_status == 0:
-        order.order_status = 2
-        order.save()
-        messages.success(request, 'Order canceled successfully')
-    else:
-        messages.error(request, 'Something wrong')
+    # the status check and the update in one write transaction
+    with sqlite.immediate_atomic():
+        order = get_object_or_404(models.ServiceOrder, pk=order_id)
+        if order.order_status == 0:
+            order.order_status = 2
+            order.save()
+            messages.success(request, 'Order canceled successfully')
+        else:
+            messages.error(request, 'Something wrong')
+    routers.wrote(request)
     return redirect('serviceorder_list')
 
 def index(request: HttpRequest):
-    num_visits = request.session.get('num_visits', 1)
-    request.session['num_visits'] = num_visits + 1
+    num_visits = visits.record(request)
+    dashboard = stats.get_dashboard()
     context = {
-        'num_carModel': models.CarModel.objects.count(),
-        'brands': models.CarModel.objects.values_list('brand', flat=True).distinct(),
-        'parts': models.PartService.objects.count(),
-        'orders': models.ServiceOrder.objects.count(),
-        'completed_orders': models.ServiceOrder.objects.filter(order_status=4).count(),
+        'num_carModel': dashboard['counters'][stats.CAR_MODELS],
+        'brands': dashboard['brands'],
+        'parts': dashboard['counters'][stats.PARTS],
+        'orders': dashboard['counters'][stats.ORDERS],
+        'completed_orders': dashboard['counters'][stats.COMPLETED_ORDERS],
         'num_visits': num_visits
     }
-    return render(request, 'library/index.html', context)
+    return visits.remember_visitor(request, render(request, 'library/index.html', context))
 
+@routers.read_only
 def parts(request: HttpRequest):
-    part_pages = Paginator(models.PartService.objects.all(), 8) #kiek irasu rodyti puslapyje
-    current_page = request.GET.get('page') or 1
+    part_pages = pagination.CursorPaginator(models.PartService.objects.all(), 8, ordering=('name', 'pk')) #kiek irasu rodyti puslapyje
+    cursor = request.GET.get('cursor')
     return render(
         request,
         'library/part_list.html',
-        {'part_list': part_pages.get_page(current_page)},
+        {
+            # only evaluated when the cached page fragment is missing
+            'part_list': SimpleLazyObject(lambda: part_pages.get_page(cursor)),
+            'catalog_version': catalog_cache.catalog_version(),
+            'cache_timeout': catalog_cache.FRAGMENT_TIMEOUT,
+        },
     )
 
 def brand_list(request: HttpRequest):
+    # cached counts, filled from the primary so a stale replica is never cached
     return render(
         request,
         'library/brand_list.html',
-        {'brand_list': models.CarModel.objects.all()},
+        {'brand_list': brands.get_hierarchy().values()},
     )
 
-def brand_detail(request: HttpRequest, pk:int):
+def brand_detail(request: HttpRequest, brand: str):
+    hierarchy = brands.get_hierarchy()
+    if brand not in hierarchy:
+        raise Http404("No such brand.")
     return render(
         request,
         'library/brand_detail.html',
-        {'brand': get_object_or_404(models.CarModel, pk=pk)},
+        {'brand': hierarchy[brand]},
     )
 
 
+@staff_member_required
+@routers.read_only
 def customer_list(request: HttpRequest):
-    customers = models.Car.objects.all()
-    return render(request, 'library/customer_list.html', {'customers': customers})
-
+    customers = models.User.objects.filter(Exists(models.Car.objects.filter(customer=OuterRef('pk'))))
+    query = request.GET.get('query')
+    if query:
+        customers = customers.filter(
+            Q(username__istartswith=query) |
+            Q(first_name__istartswith=query) |
+            Q(last_name__istartswith=query)
+        )
+    customer_pages = pagination.CursorPaginator(customers, 20, ordering=('username', 'pk'), count_total=False)
+    page = customer_pages.get_page(request.GET.get('cursor'))
+    # one grouped query for the whole page instead of a lookup per car
+    summaries = {
+        summary['customer']: summary
+        for summary in models.Car.objects.filter(customer__in=page.object_list).order_by().values('customer').annotate(
+            car_count=Count('pk', distinct=True),
+            order_count=Count('orders'),
+            last_order_date=Max('orders__date'),
+        )
+    }
+    for customer in page:
+        customer.summary = summaries.get(customer.pk, {})
+    return render(request, 'library/customer_list.html', {
+        'customers': page,
+        'search': True,
+        'search_placeholder': 'search customers...',
+    })
+
+CUSTOMER_RECENT_ORDERS = 10
+
+@staff_member_required
+@routers.read_only
 def customer_detail(request: HttpRequest, pk:int):
-    customer = get_object_or_404(models.Car, pk=pk)
-    cars = models.Car.objects.filter(car_model=customer.car_model)
-    return render(request, 'library/customer_detail.html', {'customer': customer, 'cars': cars})
+    customer = get_object_or_404(models.User, pk=pk)
+    # every query goes through the customer's cars, the (customer, plate) and (car, date) indexes
+    cars = models.Car.objects.filter(customer=customer).select_related('car_model').annotate(
+        order_count=Count('orders'), last_visit=Max('orders__date'),
+    )
+    customer_orders = models.ServiceOrder.objects.filter(car__customer=customer)
+    summary = customer_orders.aggregate(
+        order_count=Count('pk'),
+        spent=Sum('total_amount', filter=~Q(order_status__in=orders.UNPAID_STATUSES)),
+        first_visit=Min('date'),
+        last_visit=Max('date'),
+    )
+    recent_orders = customer_orders.select_related('car__car_model').with_lines().order_by(
+        '-date', '-pk',
+    )[:CUSTOMER_RECENT_ORDERS]
+    return render(request, 'library/customer_detail.html', {
+        'customer': customer,
+        'cars': cars,
+        'summary': summary,
+        'recent_orders': recent_orders,
+    })
+
+def car_model_autocomplete(request: HttpRequest):
+    # answered from the in-process index, no session, user or catalog query
+    index = car_models.get_index()
+    prefix = request.GET.get('q', '')
+    brand = request.GET.get('brand')
+    if brand:
+        return JsonResponse({'results': index.complete_models(brand, prefix)})
+    return JsonResponse({'results': [{'brand': name} for name in index.complete_brands(prefix)]})
+
+PART_AUTOCOMPLETE_LIMIT = 10
+
+def part_autocomplete(request: HttpRequest):
+    # a range scan on the name index, only the first few matches
+    prefix = request.GET.get('q', '').strip()
+    if not prefix:
+        return JsonResponse({'results': []})
+    parts = models.PartService.objects.filter(name__istartswith=prefix).order_by('name', 'pk')
+    return JsonResponse({'results': [
+        {'id': part_id, 'name': name, 'price': str(price)}
+        for part_id, name, price in parts.values_list('pk', 'name', 'price')[:PART_AUTOCOMPLETE_LIMIT]
+    ]})
 
 def review_create(request: HttpRequest):
     if request.method == 'POST':
@@ -207,10 +331,53 @@ def review_create(request: HttpRequest):
         if form.is_valid():
             review = form.save(commit=False)
             review.reviewer = request.user
-            review.save()
+            # the review and the counters its signals update are written together
+            with sqlite.immediate_atomic():
+                review.save()
+            routers.wrote(request)
             messages.success(request, 'Review added successfully.')
             return redirect('part_detail', pk=review.partservice.pk)
     else:
         form = forms.PartServiceReviewForm()
 
-    return render(request, 'partservice_review_create.html', {'form': form})
\ No newline at end of file
+    return render(request, 'partservice_review_create.html', {'form': form})
+
+
+@staff_member_required
+@routers.read_only
+def export_orders(request: HttpRequest):
+    form = forms.OrderExportForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    export_format = form.cleaned_data['format'] or 'csv'
+    stream, content_type = exports.STREAMS[export_format]
+    rows = exports.export_rows(
+        form.cleaned_data['date_from'], form.cleaned_data['date_to'], form.cleaned_data['status'],
+        form.cleaned_data['min_total'], form.cleaned_data['max_total'],
+        # the rows are read while streaming, after the view returned
+        using=routers.read_database(),
+    )
+    response = StreamingHttpResponse(stream(rows), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="service_orders.{export_format}"'
+    return response
+
+
+@staff_member_required
+@routers.read_only
+def report(request: HttpRequest):
+    # reads the daily rollups only, refresh_reports keeps them current
+    form = forms.ReportForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    month = form.cleaned_data['month'] or date.today()
+    status = form.cleaned_data['status']
+    context = {
+        'form': form,
+        'month': month.replace(day=1),
+        'monthly': reports.monthly_revenue(status),
+        'parts': reports.revenue_by_part(month, status),
+        'brands': reports.revenue_by_brand(month, status),
+        'statuses': reports.revenue_by_status(month),
+        'pending_days': models.ReportDirtyDay.objects.count(),
+    }
+    return render(request, 'library/report.html', context)
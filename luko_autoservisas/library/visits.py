@@ -0,0 +1,159 @@
+"""Home page visit counter that does not write on every hit.
+
+Visits are added up in memory per process and written to VisitCount in one
+batch once VISIT_FLUSH_SIZE are pending or the oldest pending visit is
+VISIT_FLUSH_SECONDS old, and when the process exits. Visitors are told apart
+by user for logged in users and by a signed cookie otherwise, so counting a
+visit never touches the session. The stored count of a visitor is read once
+per process and kept up to date by the flushes of that process.
+
+An anonymous visitor's first visit, made before they had the cookie, is not
+stored, so bots and one-off visitors that never send the cookie back leave no
+row behind.
+"""
+import atexit
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpRequest, HttpResponse
+from django.utils import timezone
+from . import models
+
+COOKIE_NAME = 'library_visitor'
+COOKIE_SALT = 'library.visits'
+COOKIE_MAX_AGE = 365 * 24 * 60 * 60
+# stored counts kept per process, the least recently seen visitors are dropped first
+STORED_COUNTS_SIZE = 10000
+
+
+class VisitBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.oldest = None
+        self.stored = OrderedDict()
+
+    def add(self, visitor: str) -> int:
+        """Counts a visit and returns the visits of this visitor not written yet."""
+        with self.lock:
+            self.pending[visitor] += 1
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+            pending = self.pending[visitor]
+            due = (
+                sum(self.pending.values()) >= getattr(settings, 'VISIT_FLUSH_SIZE', 100)
+                or time.monotonic() - self.oldest >= getattr(settings, 'VISIT_FLUSH_SECONDS', 60)
+            )
+        if due:
+            self.flush()
+        return pending
+
+    def pending_for(self, visitor: str) -> int:
+        with self.lock:
+            return self.pending[visitor]
+
+    def stored_for(self, visitor: str) -> int:
+        """The written visits of a visitor, read from the database on the first call only."""
+        with self.lock:
+            if visitor in self.stored:
+                self.stored.move_to_end(visitor)
+                return self.stored[visitor]
+        stored = models.VisitCount.objects.filter(visitor=visitor).values_list('count', flat=True).first() or 0
+        with self.lock:
+            stored = self.stored.setdefault(visitor, stored)
+            if len(self.stored) > STORED_COUNTS_SIZE:
+                self.stored.popitem(last=False)
+        return stored
+
+    def take(self) -> Counter:
+        with self.lock:
+            pending, self.pending, self.oldest = self.pending, Counter(), None
+        return pending
+
+    def flush(self) -> int:
+        """Writes the pending visits, returns how many were written."""
+        pending = self.take()
+        if not pending:
+            return 0
+        try:
+            write(pending)
+        except Exception:
+            # put them back for the next flush rather than losing them
+            with self.lock:
+                self.pending.update(pending)
+                if self.oldest is None:
+                    self.oldest = time.monotonic()
+            raise
+        with self.lock:
+            for visitor in pending.keys() & self.stored.keys():
+                self.stored[visitor] += pending[visitor]
+        return sum(pending.values())
+
+    def clear(self) -> None:
+        self.take()
+        with self.lock:
+            self.stored.clear()
+
+
+def write(pending: Counter) -> None:
+    # visitors with the same number of new visits share one UPDATE
+    by_delta = defaultdict(list)
+    for visitor, delta in pending.items():
+        by_delta[delta].append(visitor)
+    now = timezone.now()
+    with transaction.atomic():
+        models.VisitCount.objects.bulk_create(
+            [models.VisitCount(visitor=visitor) for visitor in pending], ignore_conflicts=True,
+        )
+        for delta, visitors in by_delta.items():
+            models.VisitCount.objects.filter(visitor__in=visitors).update(
+                count=F('count') + delta, last_visit=now,
+            )
+
+
+buffer = VisitBuffer()
+
+
+def _flush_at_exit():
+    try:
+        buffer.flush()
+    except Exception:
+        pass
+
+
+atexit.register(_flush_at_exit)
+
+
+def visitor_key(request: HttpRequest) -> str:
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    token = request.get_signed_cookie(COOKIE_NAME, default=None, salt=COOKIE_SALT)
+    if token is None:
+        # set on the response by remember_visitor()
+        token = request.library_visitor_token = uuid.uuid4().hex
+    return f'anon:{token}'
+
+
+def record(request: HttpRequest) -> int:
+    """Counts a home page visit, returns the visitor's visits including this one."""
+    visitor = visitor_key(request)
+    if getattr(request, 'library_visitor_token', None):
+        # first visit, before the cookie; not stored, it is added back below when the visitor returns
+        return 1
+    buffer.add(visitor)
+    first_visit = 0 if request.user.is_authenticated else 1
+    # read after the add, a flush it caused has moved the visits to the stored count
+    return buffer.stored_for(visitor) + buffer.pending_for(visitor) + first_visit
+
+
+def remember_visitor(request: HttpRequest, response: HttpResponse) -> HttpResponse:
+    token = getattr(request, 'library_visitor_token', None)
+    if token is not None:
+        response.set_signed_cookie(
+            COOKIE_NAME, token, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+        )
+    return response
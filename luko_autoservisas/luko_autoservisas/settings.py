@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'library.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,6 +54,33 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per request SQL and template timing, off unless REQUEST_TIMING=1 is set
+REQUEST_TIMING = os.environ.get('REQUEST_TIMING') == '1'
+REQUEST_TIMING_LOG = BASE_DIR / 'request_timing.log'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'request_timing': {
+            'class': 'logging.FileHandler',
+            'filename': REQUEST_TIMING_LOG,
+            'formatter': 'message',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'library.timing': {
+            'handlers': ['request_timing'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 ROOT_URLCONF = 'luko_autoservisas.urls'
 
 TEMPLATES = [
@@ -81,9 +109,53 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # copy of default made by the sync_replica command
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_ROUTERS = ['library.routers.ReplicaRouter']
+# read-only pages read from this alias, off unless REPLICA_DATABASE=1 is set
+REPLICA_DATABASE = 'replica' if os.environ.get('REPLICA_DATABASE') == '1' else None
+# seconds a session keeps reading from default after it wrote something
+REPLICA_STICKY_SECONDS = 30
+
+# applied to every new SQLite connection by library.sqlite, a DATABASES entry
+# can override them with its own PRAGMAS
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    # negative sizes are in KiB
+    'cache_size': -64 * 1024,
+    'busy_timeout': 10000,
+}
+
+# shared by every worker process on this host, so a cache invalidation in one
+# process reaches the others; several hosts need a networked cache instead
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
 
+# sessions are read from the cache and only written to the database when they
+# change, SESSION_CACHED_DB=0 switches back to plain database sessions
+SESSION_ENGINE = (
+    'django.contrib.sessions.backends.db' if os.environ.get('SESSION_CACHED_DB') == '0'
+    else 'django.contrib.sessions.backends.cached_db'
+)
+
+# home page visits are counted in memory by library.visits and written out
+# once this many are pending or the oldest pending one is this many seconds old
+VISIT_FLUSH_SIZE = 100
+VISIT_FLUSH_SECONDS = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -2,3 +2,10 @@ from django.contrib import admin
 from . import models
 
 admin.site.register(models.Profile)
+
+
+@admin.register(models.PhotoJob)
+class PhotoJobAdmin(admin.ModelAdmin):
+    list_display = ('profile', 'photo', 'status', 'created_at', 'processed_at')
+    list_filter = ('status',)
+    raw_id_fields = ('profile',)
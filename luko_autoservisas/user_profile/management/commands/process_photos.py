@@ -0,0 +1,109 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from library.files import content_hash
+from ... import models, photos
+
+
+class Command(BaseCommand):
+    help = "Processes queued profile photos into resized variants using a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+            help="Number of worker processes, 0 processes the photos in this process.")
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty.")
+        parser.add_argument('--sleep', type=float, default=5.0, help="Seconds to wait for new jobs.")
+        parser.add_argument('--claim-timeout', type=float, default=600.0,
+            help="Seconds after which a job still processing is taken to be left by a crashed worker and claimed again.")
+
+    def handle(self, *args, **options):
+        executor = ProcessPoolExecutor(options['workers']) if options['workers'] else None
+        try:
+            while True:
+                processed = self.process_batch(executor, options['batch_size'], options['claim_timeout'])
+                if not processed:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+        finally:
+            if executor:
+                executor.shutdown()
+
+    def claim_jobs(self, batch_size, claim_timeout):
+        now = timezone.now()
+        claimable = models.PhotoJob.objects.filter(
+            Q(status=0)
+            | Q(status=1, claimed_at__lt=now - timedelta(seconds=claim_timeout))
+            | Q(status=1, claimed_at__isnull=True)
+        )
+        job_ids = list(claimable.values_list('pk', flat=True)[:batch_size])
+        # another worker may have claimed some of them in the meantime, the
+        # claim time tells the rows this worker got apart from theirs
+        claimable.filter(pk__in=job_ids).update(status=1, claimed_at=now)
+        return list(models.PhotoJob.objects.filter(pk__in=job_ids, status=1, claimed_at=now))
+
+    def process_batch(self, executor, batch_size, claim_timeout):
+        jobs = self.claim_jobs(batch_size, claim_timeout)
+        if not jobs:
+            return 0
+        media_root = str(settings.MEDIA_ROOT)
+        sources = [os.path.join(media_root, job.photo) for job in jobs]
+        hashed = self.run(executor, content_hash, [(source,) for source in sources])
+        # content a finished job already has variants for is not rendered again
+        processed = set(models.PhotoJob.objects.filter(
+            status=2, content_hash__in=[photo_hash for photo_hash, error in hashed if not error],
+        ).values_list('content_hash', flat=True))
+        # one render per new content, the first job with it renders for the rest of the batch
+        renderers = {}
+        for job, source, (photo_hash, error) in zip(jobs, sources, hashed):
+            if not error and photo_hash not in processed:
+                renderers.setdefault(photo_hash, (job.pk, source))
+        rendered = dict(zip(renderers, self.run(executor, photos.render_variants, [
+            (source, media_root, photo_hash) for photo_hash, (job_id, source) in renderers.items()
+        ])))
+        for job, (photo_hash, error) in zip(jobs, hashed):
+            result = None
+            if not error:
+                names, error = rendered.get(photo_hash, (photos.variant_names(photo_hash), ''))
+                renderer_id = renderers[photo_hash][0] if photo_hash in renderers else None
+                result = {'hash': photo_hash, 'names': names, 'skipped': renderer_id != job.pk}
+            self.finish(job, result, error)
+        return len(jobs)
+
+    def run(self, executor, function, calls):
+        """(result, error) of function for each argument tuple, in the pool when there is one."""
+        if executor:
+            futures = [executor.submit(function, *args) for args in calls]
+            return [self.collect(future.result) for future in futures]
+        return [self.collect(function, *args) for args in calls]
+
+    def collect(self, function, *args):
+        try:
+            return function(*args), ''
+        except Exception as error:
+            return None, repr(error)
+
+    def finish(self, job, result, error):
+        job.processed_at = timezone.now()
+        if error:
+            job.status, job.error = 3, error
+            job.save(update_fields=['status', 'error', 'processed_at'])
+            self.stderr.write(f"{job.photo}: {error}")
+            return
+        job.status, job.content_hash = 2, result['hash']
+        job.save(update_fields=['status', 'content_hash', 'processed_at'])
+        # update() skips Profile.save, and the photo filter leaves a profile
+        # alone if its photo was replaced while this job was running
+        models.Profile.objects.filter(pk=job.profile_id, photo=job.photo).update(
+            photo_hash=result['hash'],
+            photo_display=result['names']['display'],
+            photo_thumbnail=result['names']['thumbnail'],
+        )
+        state = "already processed" if result['skipped'] else "processed"
+        self.stdout.write(f"{job.photo}: {state}")
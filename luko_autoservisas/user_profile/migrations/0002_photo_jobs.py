@@ -0,0 +1,47 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_profile', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='photo_display',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='', verbose_name='display photo'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='photo_hash',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='photo hash'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='photo_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='', verbose_name='photo thumbnail'),
+        ),
+        migrations.CreateModel(
+            name='PhotoJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('photo', models.CharField(max_length=255, verbose_name='photo')),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'pending'), (1, 'processing'), (2, 'done'), (3, 'failed')], db_index=True, default=0, verbose_name='status')),
+                ('content_hash', models.CharField(blank=True, db_index=True, default='', max_length=64, verbose_name='content hash')),
+                ('error', models.TextField(blank=True, default='', verbose_name='error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='processed at')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='photo_jobs', to='user_profile.profile', verbose_name='profile')),
+            ],
+            options={
+                'verbose_name': 'photo job',
+                'verbose_name_plural': 'photo jobs',
+                'ordering': ['pk'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.5 on 2026-10-18 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_profile', '0002_photo_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photojob',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='claimed at'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='photo_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='photo hash'),
+        ),
+    ]
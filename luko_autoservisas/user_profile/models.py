@@ -2,7 +2,6 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
-from PIL import Image
 
 
 User = get_user_model()
@@ -17,22 +16,66 @@ class Profile(models.Model):
         null=True, blank=True
     )
     photo = models.ImageField(_("photo"), upload_to="user/profile/img/", null=True, blank=True)
+    photo_hash = models.CharField(_("photo hash"), max_length=64, blank=True, default='', editable=False)
+    photo_display = models.ImageField(_("display photo"), null=True, blank=True, editable=False)
+    photo_thumbnail = models.ImageField(_("photo thumbnail"), null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = _("profile")
         verbose_name_plural = _("profiles")
 
     def save(self, *args, **kwargs) -> None:
+        previous_photo = None
+        if self.pk:
+            previous_photo = Profile.objects.filter(pk=self.pk).values_list('photo', flat=True).first()
+        photo_changed = (self.photo.name or None) != (previous_photo or None)
+        if photo_changed:
+            self.photo_hash = ''
+            self.photo_display = None
+            self.photo_thumbnail = None
         super().save(*args, **kwargs)
-        if self.photo:
-            photo = Image.open(self.photo.path)
-            if photo.height > 300 or photo.width > 500:
-                resized_dimensions = (800, 300)
-                photo.thumbnail(resized_dimensions)
-                photo.save(self.photo.path)
+        # resizing is left to the process_photos worker, only a new photo is queued
+        if photo_changed and self.photo:
+            PhotoJob.objects.create(profile=self, photo=self.photo.name)
+
+    @property
+    def display_photo(self):
+        return self.photo_display or self.photo
 
     def __str__(self):
         return f"{self.user}"
 
     def get_absolute_url(self):
-        return reverse("profile_detail", kwargs={"pk": self.pk})
\ No newline at end of file
+        return reverse("profile_detail", kwargs={"pk": self.pk})
+
+
+JOB_STATUS = (
+    (0, _('pending')),
+    (1, _('processing')),
+    (2, _('done')),
+    (3, _('failed')),
+)
+
+
+class PhotoJob(models.Model):
+    profile = models.ForeignKey(
+        Profile,
+        verbose_name=_("profile"),
+        on_delete=models.CASCADE,
+        related_name='photo_jobs',
+    )
+    photo = models.CharField(_("photo"), max_length=255)
+    status = models.PositiveSmallIntegerField(_("status"), choices=JOB_STATUS, default=0, db_index=True)
+    content_hash = models.CharField(_("content hash"), max_length=64, blank=True, default='', db_index=True)
+    error = models.TextField(_("error"), blank=True, default='')
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+    claimed_at = models.DateTimeField(_("claimed at"), null=True, blank=True)
+    processed_at = models.DateTimeField(_("processed at"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("photo job")
+        verbose_name_plural = _("photo jobs")
+        ordering = ['pk']
+
+    def __str__(self):
+        return f"{self.profile} {self.photo} {self.get_status_display()}"
\ No newline at end of file
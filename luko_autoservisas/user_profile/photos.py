@@ -0,0 +1,34 @@
+import os
+from PIL import Image
+from library.files import save_image
+
+VARIANTS_DIR = 'user/profile/img/variants'
+# name: largest width and height, thumbnail() keeps the aspect ratio
+VARIANT_SIZES = {
+    'display': (800, 300),
+    'thumbnail': (150, 150),
+}
+
+
+def variant_name(photo_hash: str, variant: str) -> str:
+    return f"{VARIANTS_DIR}/{photo_hash}_{variant}.jpg"
+
+
+def variant_names(photo_hash: str) -> dict:
+    return {variant: variant_name(photo_hash, variant) for variant in VARIANT_SIZES}
+
+
+def render_variants(source_path: str, media_root: str, photo_hash: str) -> dict:
+    """Writes the resized variants of a photo under its content hash, returns their names.
+
+    Runs in worker processes, so it only gets plain paths and touches no models.
+    """
+    names = variant_names(photo_hash)
+    os.makedirs(os.path.join(media_root, VARIANTS_DIR), exist_ok=True)
+    with Image.open(source_path) as photo:
+        photo = photo.convert('RGB')
+        for variant, size in VARIANT_SIZES.items():
+            resized = photo.copy()
+            resized.thumbnail(size)
+            save_image(resized, os.path.join(media_root, names[variant]), 'JPEG', quality=85, optimize=True)
+    return names
@@ -1,3 +1,118 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from . import models, photos
 
-# Create your tests here.
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+# the default cache is shared with the running workers, the tests get their own
+test_caches = override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+
+
+def setUpModule():
+    test_caches.enable()
+
+
+def tearDownModule():
+    test_caches.disable()
+
+
+def make_photo(name='photo.png', color='red', size=(1200, 900)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class PhotoJobTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='jonas', password='slaptazodis')
+        self.profile = models.Profile.objects.create(user=self.user)
+
+    def process(self):
+        call_command('process_photos', workers=0, once=True, stdout=io.StringIO())
+
+    def test_only_new_photo_is_queued(self):
+        self.profile.photo = make_photo()
+        self.profile.save()
+        self.profile.save()
+        self.assertEqual(models.PhotoJob.objects.filter(status=0).count(), 1)
+
+    def test_worker_writes_resized_variants(self):
+        self.profile.photo = make_photo()
+        self.profile.save()
+        self.process()
+        self.profile.refresh_from_db()
+        self.assertEqual(models.PhotoJob.objects.get().status, 2)
+        with Image.open(self.profile.photo_display.path) as display:
+            self.assertEqual(display.size, (400, 300))
+        with Image.open(self.profile.photo_thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.size, (150, 113))
+        self.assertEqual(self.profile.display_photo, self.profile.photo_display)
+
+    def test_worker_uses_process_pool(self):
+        self.profile.photo = make_photo()
+        self.profile.save()
+        call_command('process_photos', workers=1, once=True, stdout=io.StringIO())
+        self.assertEqual(models.PhotoJob.objects.get().status, 2)
+
+    def test_same_content_is_not_processed_twice(self):
+        self.profile.photo = make_photo('first.png')
+        self.profile.save()
+        other = models.Profile.objects.create(
+            user=User.objects.create_user(username='petras', password='slaptazodis'),
+            photo=make_photo('second.png'),
+        )
+        output = io.StringIO()
+        call_command('process_photos', workers=0, once=True, stdout=output)
+        self.assertIn('already processed', output.getvalue())
+        other.refresh_from_db()
+        self.profile.refresh_from_db()
+        self.assertEqual(other.photo_display.name, self.profile.photo_display.name)
+
+    def test_processed_content_is_found_by_hash(self):
+        self.profile.photo = make_photo('first.png')
+        self.profile.save()
+        self.process()
+        models.Profile.objects.create(
+            user=User.objects.create_user(username='petras', password='slaptazodis'),
+            photo=make_photo('second.png'),
+        )
+        with mock.patch.object(photos, 'render_variants') as render_variants:
+            self.process()
+        render_variants.assert_not_called()
+        self.assertEqual(models.PhotoJob.objects.filter(status=2).count(), 2)
+
+    def test_stale_claim_is_taken_again(self):
+        self.profile.photo = make_photo()
+        self.profile.save()
+        models.PhotoJob.objects.update(status=1, claimed_at=timezone.now() - timedelta(hours=1))
+        self.process()
+        self.assertEqual(models.PhotoJob.objects.get().status, 2)
+
+    def test_recent_claim_is_left_alone(self):
+        self.profile.photo = make_photo()
+        self.profile.save()
+        models.PhotoJob.objects.update(status=1, claimed_at=timezone.now())
+        self.process()
+        self.assertEqual(models.PhotoJob.objects.get().status, 1)
+
+    def test_broken_photo_fails_job(self):
+        self.profile.photo = SimpleUploadedFile('broken.png', b'not an image')
+        self.profile.save()
+        call_command('process_photos', workers=0, once=True, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(models.PhotoJob.objects.get().status, 3)